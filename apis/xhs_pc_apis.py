@@ -1,18 +1,157 @@
 # encoding: utf-8
+import copy
 import json
 import re
 import urllib
+import threading
 import requests
-from xhs_utils.xhs_util import splice_str, generate_request_params, generate_x_b3_traceid, get_common_headers
+from concurrent.futures import ThreadPoolExecutor, wait
+from xhs_utils.paginate_util import Paginator, collect, cursor_page, number_page
+from xhs_utils.proxy_util import send_with_proxies
+from xhs_utils.rate_limit_util import Rate_Limiter
+from xhs_utils.session_util import Session_Pool
+from xhs_utils.xhs_util import splice_str, generate_request_params, generate_many_request_params, generate_x_b3_traceid, get_common_headers, get_note_create_time
 from loguru import logger
 
+def parse_url(url: str):
+    """
+        解析笔记或用户的url，返回 (id, 查询参数字典)
+    """
+    urlParse = urllib.parse.urlparse(url)
+    url_id = urlParse.path.split("/")[-1].split('?')[0]  # 处理路径中可能包含的查询参数
+    # 安全解析查询参数
+    kvDist = {}
+    if urlParse.query:
+        kvs = urlParse.query.split('&')
+        for kv in kvs:
+            if kv and '=' in kv:
+                key, value = kv.split('=', 1)  # 只分割第一个等号
+                kvDist[key] = value
+    return url_id, kvDist
+
+def split_new_notes(notes: list, known_note_ids):
+    """
+        增量爬取时从一页笔记中找出新笔记
+        用户的笔记按发布时间倒序，遇到已知的非置顶笔记后，之后的笔记都更早，不再作为新笔记
+        返回 (新笔记列表, 是否停止翻页)，整页都是已知笔记或遇到已知的非置顶笔记时停止
+    """
+    new_notes = []
+    reached_known = False
+    for note in notes:
+        if note['note_id'] in known_note_ids:
+            if not note.get('interact_info', {}).get('sticky', False):
+                reached_known = True
+        elif not reached_known:
+            new_notes.append(note)
+    return new_notes, reached_known or (len(notes) > 0 and not new_notes)
+
+def filter_notes_by_time(notes: list, cutoff_time, out_of_window: int = 0, max_out_of_window: int = 3):
+    """
+        按笔记id中的发布时间过滤早于 cutoff_time 的笔记，不需要请求笔记详情
+        用户的笔记按发布时间倒序，连续 max_out_of_window 篇（不含置顶）都早于 cutoff_time 时停止翻页
+        :param out_of_window: 之前的页末尾连续早于 cutoff_time 的笔记数
+        返回 (时间范围内的笔记列表, 连续早于 cutoff_time 的笔记数, 是否停止翻页)
+    """
+    cutoff_timestamp = cutoff_time.timestamp()
+    kept = []
+    for note in notes:
+        create_time = get_note_create_time(note['note_id'])
+        if create_time is not None and create_time < cutoff_timestamp:
+            if not note.get('interact_info', {}).get('sticky', False):
+                out_of_window += 1
+            continue
+        if not note.get('interact_info', {}).get('sticky', False):
+            out_of_window = 0
+        kept.append(note)
+    return kept, out_of_window, out_of_window >= max_out_of_window
+
+def user_notes_filter(known_note_ids=None, cutoff_time=None, max_out_of_window: int = 3):
+    """
+        组合增量和时间范围过滤，返回 Paginator 使用的 filter_page，都不需要时返回None
+    """
+    if known_note_ids is None and cutoff_time is None:
+        return None
+    out_of_window = 0
+
+    def filter_page(notes):
+        nonlocal out_of_window
+        stop = False
+        if known_note_ids is not None:
+            notes, stop = split_new_notes(notes, known_note_ids)
+        if cutoff_time is not None:
+            notes, out_of_window, out_of_window_stop = filter_notes_by_time(notes, cutoff_time, out_of_window, max_out_of_window)
+            stop = stop or out_of_window_stop
+        return notes, stop
+    return filter_page
+
+def parse_homefeed_page(res_json, cursor):
+    """
+        主页推荐的翻页方式，cursor 为 (cursor_score, refresh_type, note_index)，推荐流没有尽头，需要指定数量
+    """
+    data = res_json["data"]
+    if "items" not in data:
+        return [], None
+    cursor_score, refresh_type, note_index = cursor
+    return data["items"], (data["cursor_score"], 3, note_index + 20)
+
+COMMENT_PAGE_API = "/api/sns/web/v2/comment/page"
+SUB_COMMENT_PAGE_API = "/api/sns/web/v2/comment/sub/page"
+
+def comment_page_recorder(raw_pages: list, api: str, root_comment_id: str = None):
+    """
+        返回把评论接口每页原始json追加到 raw_pages 的 on_page 回调，raw_pages 为None时返回None
+        每页保存为 {'api': 接口, 'root_comment_id': 二级评论所属的一级评论id, 'cursor': 请求的cursor, 'response': 接口返回的json}
+        展开二级评论时会修改一级评论的 sub_comments，所以保存的是返回时的副本
+    """
+    if raw_pages is None:
+        return None
+    return lambda res_json, cursor: raw_pages.append({'api': api, 'root_comment_id': root_comment_id, 'cursor': cursor, 'response': copy.deepcopy(res_json)})
+
 """
     获小红书的api
     :param cookies_str: 你的cookies
 """
 class XHS_Apis():
-    def __init__(self):
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, keep_alive: bool = True, rate_limiter: Rate_Limiter = None,
+                 comment_workers: int = 8):
+        """
+            :param pool_connections: 每个代理缓存的连接池数量
+            :param pool_maxsize: 每个host最多保持的连接数，并发请求时应不小于并发数
+            :param keep_alive: 是否复用连接
+            :param rate_limiter: 按账号和接口限速的限速器，多个实例可共用同一个，默认不限速
+            :param comment_workers: 所有 get_note_all_comment 调用共用的展开二级评论的线程数
+        """
         self.base_url = "https://edith.xiaohongshu.com"
+        self.session_pool = Session_Pool(pool_connections, pool_maxsize, keep_alive)
+        self.rate_limiter = rate_limiter
+        self.comment_executor = ThreadPoolExecutor(max_workers=comment_workers, thread_name_prefix='inner-comment')
+
+    def get_session(self, proxies: dict = None):
+        """
+            获取代理对应的keep-alive session
+        """
+        return self.session_pool.get(proxies)
+
+    def request(self, method: str, api: str, headers: dict, cookies: dict, data=None, proxies: dict = None):
+        """
+            发送请求并返回json
+            配置了限速器时按账号和接口限速，并根据返回结果调整速率
+            proxies 可以是代理字典，也可以是 Proxy_Pool，使用代理池时每次请求选择最优代理
+        """
+        a1 = cookies.get('a1', '')
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(a1, api)
+        response = send_with_proxies(lambda proxies: self.get_session(proxies).request(method, self.base_url + api, headers=headers, data=data, cookies=cookies, proxies=proxies), proxies)
+        if self.rate_limiter is None:
+            return response.json()
+        try:
+            res_json = response.json()
+        except Exception:
+            self.rate_limiter.feedback(a1, api, False, response.status_code)
+            raise
+        success = isinstance(res_json, dict) and res_json.get('success', False)
+        self.rate_limiter.feedback(a1, api, success, response.status_code)
+        return res_json
 
     def get_homefeed_all_channel(self, cookies_str: str, proxies: dict = None):
         """
@@ -23,8 +162,7 @@ class XHS_Apis():
         try:
             api = "/api/sns/web/v1/homefeed/category"
             headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -63,14 +201,26 @@ class XHS_Apis():
                 "need_filter_image": False
             }
             headers, cookies, trans_data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=trans_data, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('POST', api, headers, cookies, trans_data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_homefeed_recommend(self, category, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取主页推荐的笔记，推荐流没有尽头，需要指定 max_items 或 stop_when
+            :param category: 你想要获取的频道
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回主页推荐笔记的生成器
+        """
+        return Paginator(lambda cursor: self.get_homefeed_recommend(category, *cursor, cookies_str, proxies), parse_homefeed_page,
+                         ("", 1, 0), max_items, stop_when, prefetch=prefetch)
+
     def get_homefeed_recommend_by_num(self, category, require_num, cookies_str: str, proxies: dict = None):
         """
             根据数量获取主页推荐的笔记
@@ -79,28 +229,7 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             根据数量返回主页推荐的笔记
         """
-        cursor_score, refresh_type, note_index = "", 1, 0
-        note_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_homefeed_recommend(category, cursor_score, refresh_type, note_index, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                cursor_score = res_json["data"]["cursor_score"]
-                refresh_type = 3
-                note_index += 20
-                if len(note_list) > require_num:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
-        return success, msg, note_list
+        return collect(self.iter_homefeed_recommend(category, cookies_str, proxies, max_items=require_num))
 
     def get_user_info(self, user_id: str, cookies_str: str, proxies: dict = None):
         """
@@ -117,8 +246,7 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -135,8 +263,7 @@ class XHS_Apis():
         try:
             api = f"/api/sns/web/v1/user/selfinfo"
             headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -154,8 +281,7 @@ class XHS_Apis():
         try:
             api = f"/api/sns/web/v2/user/me"
             headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -183,8 +309,7 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -192,44 +317,37 @@ class XHS_Apis():
         return success, msg, res_json
 
 
-    def get_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None):
+    def iter_user_notes(self, user_url: str, cookies_str: str, proxies: dict = None, known_note_ids=None, cutoff_time=None, max_out_of_window: int = 3,
+                        max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+           逐条获取用户的笔记，边翻页边返回
+           :param user_url: 你想要获取的用户的url
+           :param cookies_str: 你的cookies
+           :param known_note_ids: 已爬取过的笔记id集合（或只有最新一篇的id），传入时只返回新笔记，翻到只有已知笔记的页就停止
+           :param cutoff_time: datetime，只返回之后发布的笔记，根据笔记id中的时间判断，不需要请求笔记详情
+           :param max_out_of_window: 连续多少篇笔记早于 cutoff_time 时停止翻页
+           :param max_items: 最多返回多少条，None 为不限
+           :param stop_when: stop_when(item) 返回True时停止翻页
+           :param prefetch: 处理当前页时在后台请求下一页
+           返回用户笔记的生成器
+        """
+        user_id, kvDist = parse_url(user_url)
+        xsec_token = kvDist.get('xsec_token', "")
+        xsec_source = kvDist.get('xsec_source', "pc_search")
+        return Paginator(lambda cursor: self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), cursor_page("notes"),
+                         '', max_items, stop_when, user_notes_filter(known_note_ids, cutoff_time, max_out_of_window), prefetch)
+
+    def get_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None, known_note_ids=None, cutoff_time=None, max_out_of_window: int = 3):
         """
            获取用户所有笔记
-           :param user_id: 你想要获取的用户的id
+           :param user_url: 你想要获取的用户的url
            :param cookies_str: 你的cookies
+           :param known_note_ids: 已爬取过的笔记id集合（或只有最新一篇的id），传入时只返回新笔记，翻到只有已知笔记的页就停止
+           :param cutoff_time: datetime，只返回之后发布的笔记，根据笔记id中的时间判断，不需要请求笔记详情
+           :param max_out_of_window: 连续多少篇笔记早于 cutoff_time 时停止翻页
            返回用户的所有笔记
         """
-        cursor = ''
-        note_list = []
-        try:
-            urlParse = urllib.parse.urlparse(user_url)
-            user_id = urlParse.path.split("/")[-1].split('?')[0]  # 处理路径中可能包含的查询参数
-            # 安全解析查询参数
-            kvDist = {}
-            if urlParse.query:
-                kvs = urlParse.query.split('&')
-                for kv in kvs:
-                    if kv and '=' in kv:
-                        key, value = kv.split('=', 1)  # 只分割第一个等号
-                        kvDist[key] = value
-            xsec_token = kvDist.get('xsec_token', "")
-            xsec_source = kvDist.get('xsec_source', "pc_search")
-            while True:
-                success, msg, res_json = self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+        return collect(self.iter_user_notes(user_url, cookies_str, proxies, known_note_ids, cutoff_time, max_out_of_window))
 
     def get_user_like_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
         """
@@ -252,53 +370,37 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_user_like_notes(self, user_url: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取用户喜欢的笔记
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回用户喜欢笔记的生成器
+        """
+        user_id, kvDist = parse_url(user_url)
+        xsec_token = kvDist.get('xsec_token', "")
+        xsec_source = kvDist.get('xsec_source', "pc_user")
+        return Paginator(lambda cursor: self.get_user_like_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), cursor_page("notes"),
+                         '', max_items, stop_when, prefetch=prefetch)
+
     def get_user_all_like_note_info(self, user_url: str, cookies_str: str, proxies: dict = None):
         """
             获取用户所有喜欢笔记
-            :param user_id: 你想要获取的用户的id
+            :param user_url: 你想要获取的用户的url
             :param cookies_str: 你的cookies
             返回用户的所有喜欢笔记
         """
-        cursor = ''
-        note_list = []
-        try:
-            urlParse = urllib.parse.urlparse(user_url)
-            user_id = urlParse.path.split("/")[-1].split('?')[0]
-            # 安全解析查询参数
-            kvDist = {}
-            if urlParse.query:
-                kvs = urlParse.query.split('&')
-                for kv in kvs:
-                    if kv and '=' in kv:
-                        key, value = kv.split('=', 1)
-                        kvDist[key] = value
-            xsec_token = kvDist.get('xsec_token', "")
-            xsec_source = kvDist.get('xsec_source', "pc_user")
-            while True:
-                success, msg, res_json = self.get_user_like_note_info(user_id, cursor, cookies_str, xsec_token,
-                                                                      xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+        return collect(self.iter_user_like_notes(user_url, cookies_str, proxies))
 
     def get_user_collect_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
         """
@@ -321,91 +423,87 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_user_collect_notes(self, user_url: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取用户收藏的笔记
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回用户收藏笔记的生成器
+        """
+        user_id, kvDist = parse_url(user_url)
+        xsec_token = kvDist.get('xsec_token', "")
+        xsec_source = kvDist.get('xsec_source', "pc_search")
+        return Paginator(lambda cursor: self.get_user_collect_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), cursor_page("notes"),
+                         '', max_items, stop_when, prefetch=prefetch)
+
     def get_user_all_collect_note_info(self, user_url: str, cookies_str: str, proxies: dict = None):
         """
             获取用户所有收藏笔记
-            :param user_id: 你想要获取的用户的id
+            :param user_url: 你想要获取的用户的url
             :param cookies_str: 你的cookies
             返回用户的所有收藏笔记
         """
-        cursor = ''
-        note_list = []
-        try:
-            urlParse = urllib.parse.urlparse(user_url)
-            user_id = urlParse.path.split("/")[-1].split('?')[0]
-            # 安全解析查询参数
-            kvDist = {}
-            if urlParse.query:
-                kvs = urlParse.query.split('&')
-                for kv in kvs:
-                    if kv and '=' in kv:
-                        key, value = kv.split('=', 1)
-                        kvDist[key] = value
-            xsec_token = kvDist.get('xsec_token', "")
-            xsec_source = kvDist.get('xsec_source', "pc_search")
-            while True:
-                success, msg, res_json = self.get_user_collect_note_info(user_id, cursor, cookies_str, xsec_token,
-                                                                         xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+        return collect(self.iter_user_collect_notes(user_url, cookies_str, proxies))
+
+    def get_note_info_request(self, url: str):
+        """
+            笔记详情请求的 (api, data)
+            :param url: 笔记的url
+        """
+        note_id, kvDist = parse_url(url)
+        api = f"/api/sns/web/v1/feed"
+        data = {
+            "source_note_id": note_id,
+            "image_formats": [
+                "jpg",
+                "webp",
+                "avif"
+            ],
+            "extra": {
+                "need_body_topic": "1"
+            },
+            "xsec_source": kvDist.get('xsec_source', "pc_search"),
+            "xsec_token": kvDist.get('xsec_token', "")
+        }
+        return api, data
 
-    def get_note_info(self, url: str, cookies_str: str, proxies: dict = None):
+    def generate_note_info_params(self, urls: list, cookies_str: str):
+        """
+            批量生成笔记详情请求的参数，所有签名通过 sign_many 一次生成，每个签名进程只需要一次往返
+            签名包含时间戳，生成后应尽快传给 get_note_info 发送
+            :param urls: 笔记的url列表
+            :param cookies_str: 你的cookies
+            按顺序返回 [(headers, cookies, data), ...]
+        """
+        request_list = [(*self.get_note_info_request(url), 'POST') for url in urls]
+        return generate_many_request_params(cookies_str, request_list)
+
+    def get_note_info(self, url: str, cookies_str: str, proxies: dict = None, request_params: tuple = None):
         """
             获取笔记的详细
             :param url: 你想要获取的笔记的url
             :param cookies_str: 你的cookies
             :param xsec_source: 你的xsec_source 默认为pc_search pc_user pc_feed
+            :param request_params: generate_note_info_params 预先生成的 (headers, cookies, data)，为None时现场签名
             返回笔记的详细
         """
         res_json = None
         try:
-            urlParse = urllib.parse.urlparse(url)
-            note_id = urlParse.path.split("/")[-1].split('?')[0]
-            # 安全解析查询参数
-            kvDist = {}
-            if urlParse.query:
-                kvs = urlParse.query.split('&')
-                for kv in kvs:
-                    if kv and '=' in kv:
-                        key, value = kv.split('=', 1)
-                        kvDist[key] = value
-            api = f"/api/sns/web/v1/feed"
-            data = {
-                "source_note_id": note_id,
-                "image_formats": [
-                    "jpg",
-                    "webp",
-                    "avif"
-                ],
-                "extra": {
-                    "need_body_topic": "1"
-                },
-                "xsec_source": kvDist.get('xsec_source', "pc_search"),
-                "xsec_token": kvDist.get('xsec_token', "")
-            }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            api, data = self.get_note_info_request(url)
+            if request_params is None:
+                request_params = generate_request_params(cookies_str, api, data, 'POST')
+            headers, cookies, data = request_params
+            res_json = self.request('POST', api, headers, cookies, data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -428,8 +526,7 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -535,14 +632,28 @@ class XHS_Apis():
                 ]
             }
             headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('POST', api, headers, cookies, data.encode('utf-8'), proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_search_notes(self, query: str, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None,
+                          max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取搜索笔记的结果
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            参数含义同 search_note
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回搜索结果的生成器
+        """
+        return Paginator(lambda page: self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies),
+                         number_page("items"), 1, max_items, stop_when, prefetch=prefetch)
+
     def search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
         """
             指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
@@ -557,26 +668,7 @@ class XHS_Apis():
             :param geo: 定位信息 经纬度
             返回搜索的结果
         """
-        page = 1
-        note_list = []
-        try:
-            while True:
-                success, msg, res_json = self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                page += 1
-                if len(note_list) >= require_num or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
-        return success, msg, note_list
+        return collect(self.iter_search_notes(query, cookies_str, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies, max_items=require_num))
 
     def search_user(self, query: str, cookies_str: str, page=1, proxies: dict = None):
         """
@@ -600,14 +692,25 @@ class XHS_Apis():
                 }
             }
             headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('POST', api, headers, cookies, data.encode('utf-8'), proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_search_users(self, query: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取搜索用户的结果
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回搜索结果的生成器
+        """
+        return Paginator(lambda page: self.search_user(query, cookies_str, page, proxies), number_page("users"), 1, max_items, stop_when, prefetch=prefetch)
+
     def search_some_user(self, query: str, require_num: int, cookies_str: str, proxies: dict = None):
         """
             指定数量搜索用户
@@ -616,26 +719,7 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回搜索的结果
         """
-        page = 1
-        user_list = []
-        try:
-            while True:
-                success, msg, res_json = self.search_user(query, cookies_str, page, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "users" not in res_json["data"]:
-                    break
-                users = res_json["data"]["users"]
-                user_list.extend(users)
-                page += 1
-                if len(user_list) >= require_num or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(user_list) > require_num:
-            user_list = user_list[:require_num]
-        return success, msg, user_list
+        return collect(self.iter_search_users(query, cookies_str, proxies, max_items=require_num))
 
     def get_note_out_comment(self, note_id: str, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
@@ -647,7 +731,7 @@ class XHS_Apis():
         """
         res_json = None
         try:
-            api = "/api/sns/web/v2/comment/page"
+            api = COMMENT_PAGE_API
             params = {
                 "note_id": note_id,
                 "cursor": cursor,
@@ -657,14 +741,27 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_note_out_comments(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False, on_page=None):
+        """
+            逐条获取笔记的一级评论，评论再多也只在内存中保留一页
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
+            返回一级评论的生成器
+        """
+        return Paginator(lambda cursor: self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies), cursor_page("comments"),
+                         '', max_items, stop_when, prefetch=prefetch, on_page=on_page)
+
     def get_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
             获取笔记的全部一级评论
@@ -672,25 +769,7 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回笔记的全部一级评论
         """
-        cursor = ''
-        note_out_comment_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                comments = res_json["data"]["comments"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_out_comment_list.extend(comments)
-                if len(note_out_comment_list) == 0 or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_out_comment_list
+        return collect(self.iter_note_out_comments(note_id, xsec_token, cookies_str, proxies))
 
     def get_note_inner_comment(self, comment: dict, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
@@ -702,7 +781,7 @@ class XHS_Apis():
         """
         res_json = None
         try:
-            api = "/api/sns/web/v2/comment/sub/page"
+            api = SUB_COMMENT_PAGE_API
             params = {
                 "note_id": comment['note_id'],
                 "root_comment_id": comment['id'],
@@ -714,73 +793,83 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
-    def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None):
+    def iter_note_inner_comments(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False, on_page=None):
+        """
+            逐条获取一级评论下还没有返回的二级评论（从 sub_comment_cursor 开始）
+            :param comment 笔记的一级评论
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
+            返回二级评论的生成器
+        """
+        cursor = comment['sub_comment_cursor'] if comment['sub_comment_has_more'] else None
+        return Paginator(lambda cursor: self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies), cursor_page("comments"),
+                         cursor, max_items, stop_when, prefetch=prefetch, on_page=on_page)
+
+    def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, on_page=None):
         """
             获取笔记的全部二级评论
             :param comment 笔记的一级评论
             :param cookies_str 你的cookies
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
             返回笔记的全部二级评论
         """
-        try:
-            if not comment['sub_comment_has_more']:
-                return True, 'success', comment
-            cursor = comment['sub_comment_cursor']
-            inner_comment_list = []
-            while True:
-                success, msg, res_json = self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                comments = res_json["data"]["comments"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                inner_comment_list.extend(comments)
-                if not res_json["data"]["has_more"]:
-                    break
+        if not comment['sub_comment_has_more']:
+            return True, 'success', comment
+        success, msg, inner_comment_list = collect(self.iter_note_inner_comments(comment, xsec_token, cookies_str, proxies, on_page=on_page))
+        if success:
             comment['sub_comments'].extend(inner_comment_list)
-        except Exception as e:
-            success = False
-            msg = str(e)
         return success, msg, comment
 
-    def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None):
+    def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None, max_workers: int = 2, raw_pages: list = None):
         """
-            获取一篇文章的所有评论
-            :param note_id: 你想要获取的笔记的id
+            获取一篇文章的所有评论，每页一级评论返回后立即并发展开其中的二级评论
+            :param url: 你想要获取的笔记的url
             :param cookies_str: 你的cookies
-            返回一篇文章的所有评论
+            :param max_workers: 同时展开二级评论的一级评论数，都使用同一个账号；通过 Cookie_Pool.call 调用时整篇笔记只占用一个账号，
+                                不应超过账号的 max_concurrency
+            :param raw_pages: 传入列表时追加一级和二级评论接口每页返回的原始json，格式见 comment_page_recorder
+            返回一篇文章的所有评论，一级评论的顺序与接口返回的顺序一致
         """
         out_comment_list = []
+        # 线程由所有调用共用，每次调用同时展开的数量由信号量限制
+        semaphore = threading.BoundedSemaphore(max(max_workers, 1))
+        futures = []
         try:
-            urlParse = urllib.parse.urlparse(url)
-            note_id = urlParse.path.split("/")[-1].split('?')[0]
-            # 安全解析查询参数
-            kvDist = {}
-            if urlParse.query:
-                kvs = urlParse.query.split('&')
-                for kv in kvs:
-                    if kv and '=' in kv:
-                        key, value = kv.split('=', 1)
-                        kvDist[key] = value
-            success, msg, out_comment_list = self.get_note_all_out_comment(note_id, kvDist.get('xsec_token', ''), cookies_str, proxies)
-            if not success:
-                raise Exception(msg)
-            for comment in out_comment_list:
-                success, msg, new_comment = self.get_note_all_inner_comment(comment, kvDist['xsec_token'], cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
+            note_id, kvDist = parse_url(url)
+            xsec_token = kvDist.get('xsec_token', '')
+            paginator = self.iter_note_out_comments(note_id, xsec_token, cookies_str, proxies, prefetch=True,
+                                                    on_page=comment_page_recorder(raw_pages, COMMENT_PAGE_API))
+            for comment in paginator:
+                out_comment_list.append(comment)
+                if comment['sub_comment_has_more']:
+                    semaphore.acquire()
+                    future = self.comment_executor.submit(self.get_note_all_inner_comment, comment, xsec_token, cookies_str, proxies,
+                                                          comment_page_recorder(raw_pages, SUB_COMMENT_PAGE_API, comment['id']))
+                    future.add_done_callback(lambda future: semaphore.release())
+                    futures.append(future)
+            success, msg = True, paginator.msg
+            for future in futures:
+                inner_success, inner_msg, _ = future.result()
+                if not inner_success:
+                    raise Exception(inner_msg)
         except Exception as e:
             success = False
             msg = str(e)
+        finally:
+            # 返回前等待正在进行的请求结束，账号归还后不再有请求使用它
+            for future in futures:
+                future.cancel()
+            wait(futures)
         return success, msg, out_comment_list
 
     def get_unread_message(self, cookies_str: str, proxies: dict = None):
@@ -793,8 +882,7 @@ class XHS_Apis():
         try:
             api = "/api/sns/web/unread_count"
             headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -817,39 +905,31 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_metions(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取评论和@提醒
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回评论和@提醒的生成器
+        """
+        return Paginator(lambda cursor: self.get_metions(cursor, cookies_str, proxies), cursor_page("message_list"), '', max_items, stop_when, prefetch=prefetch)
+
     def get_all_metions(self, cookies_str: str, proxies: dict = None):
         """
             获取全部的评论和@提醒
             :param cookies_str: 你的cookies
             返回全部的评论和@提醒
         """
-        cursor = ''
-        metions_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_metions(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                metions = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                metions_list.extend(metions)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, metions_list
+        return collect(self.iter_metions(cookies_str, proxies))
 
     def get_likesAndcollects(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
@@ -867,39 +947,31 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_likesAndcollects(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取赞和收藏
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回赞和收藏的生成器
+        """
+        return Paginator(lambda cursor: self.get_likesAndcollects(cursor, cookies_str, proxies), cursor_page("message_list"), '', max_items, stop_when, prefetch=prefetch)
+
     def get_all_likesAndcollects(self, cookies_str: str, proxies: dict = None):
         """
             获取全部的赞和收藏
             :param cookies_str: 你的cookies
             返回全部的赞和收藏
         """
-        cursor = ''
-        likesAndcollects_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_likesAndcollects(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                likesAndcollects = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                likesAndcollects_list.extend(likesAndcollects)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, likesAndcollects_list
+        return collect(self.iter_likesAndcollects(cookies_str, proxies))
 
     def get_new_connections(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
@@ -917,42 +989,34 @@ class XHS_Apis():
             }
             splice_api = splice_str(api, params)
             headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self.request('GET', splice_api, headers, cookies, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_new_connections(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取新增关注
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            返回新增关注的生成器
+        """
+        return Paginator(lambda cursor: self.get_new_connections(cursor, cookies_str, proxies), cursor_page("message_list"), '', max_items, stop_when, prefetch=prefetch)
+
     def get_all_new_connections(self, cookies_str: str, proxies: dict = None):
         """
             获取全部的新增关注
             :param cookies_str: 你的cookies
             返回全部的新增关注
         """
-        cursor = ''
-        connections_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_new_connections(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                connections = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                connections_list.extend(connections)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, connections_list
+        return collect(self.iter_new_connections(cookies_str, proxies))
 
     @staticmethod
-    def get_note_no_water_video(note_id):
+    def get_note_no_water_video(note_id, proxies: dict = None):
         """
             获取笔记无水印视频
             :param note_id: 你想要获取的笔记的id
@@ -964,7 +1028,7 @@ class XHS_Apis():
         try:
             headers = get_common_headers()
             url = f"https://www.xiaohongshu.com/explore/{note_id}"
-            response = requests.get(url, headers=headers)
+            response = send_with_proxies(lambda proxies: requests.get(url, headers=headers, proxies=proxies), proxies)
             res = response.text
             video_addr = re.findall(r'<meta name="og:video" content="(.*?)">', res)[0]
         except Exception as e:
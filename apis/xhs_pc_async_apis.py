@@ -0,0 +1,776 @@
+# encoding: utf-8
+import asyncio
+import json
+import re
+import urllib
+import aiohttp
+from xhs_utils.paginate_util import Async_Paginator, collect_async, cursor_page, number_page
+from xhs_utils.proxy_util import send_with_proxies_async
+from xhs_utils.rate_limit_util import Rate_Limiter
+from xhs_utils.xhs_util import splice_str, generate_request_params, generate_x_b3_traceid, get_common_headers
+from apis.xhs_pc_apis import XHS_Apis, parse_url, user_notes_filter, parse_homefeed_page, comment_page_recorder, COMMENT_PAGE_API, SUB_COMMENT_PAGE_API
+from loguru import logger
+
+"""
+    小红书api的异步版本，方法和返回值 (success, msg, res_json) 与 XHS_Apis 一致
+    基于aiohttp，通过 limit / limit_per_host 控制连接数，单进程即可同时发起大量请求
+    用法:
+        async with XHS_Async_Apis(limit=100) as xhs_apis:
+            success, msg, note_info = await xhs_apis.get_note_info(note_url, cookies_str)
+"""
+
+
+def trans_proxies(proxies: dict = None):
+    """
+        requests格式的代理字典转换为aiohttp使用的代理地址
+    """
+    if not proxies:
+        return None
+    return proxies.get('https') or proxies.get('http')
+
+
+class XHS_Async_Apis():
+    def __init__(self, limit: int = 100, limit_per_host: int = 50, timeout: float = 30, rate_limiter: Rate_Limiter = None):
+        """
+            :param limit: 同时打开的最大连接数
+            :param limit_per_host: 每个host同时打开的最大连接数
+            :param timeout: 单个请求的超时时间（秒）
+            :param rate_limiter: 按账号和接口限速的限速器，可与 XHS_Apis 共用，默认不限速
+        """
+        self.base_url = "https://edith.xiaohongshu.com"
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            # cookies由每次请求单独传入，不在session中保存响应的cookies，避免多个账号之间串号
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def request(self, method: str, api: str, data, cookies_str: str, proxies: dict = None):
+        """
+            签名并发送请求，签名在线程池中执行，不阻塞事件循环
+            proxies 可以是代理字典，也可以是 Proxy_Pool
+            返回响应的json
+        """
+        loop = asyncio.get_running_loop()
+        headers, cookies, trans_data = await loop.run_in_executor(None, generate_request_params, cookies_str, api, data, method)
+        if trans_data:
+            trans_data = trans_data.encode('utf-8')
+        else:
+            trans_data = None
+        a1 = cookies.get('a1', '')
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(a1, api)
+
+        async def send(proxies):
+            async with self.get_session().request(method, self.base_url + api, headers=headers, data=trans_data, cookies=cookies, proxy=trans_proxies(proxies)) as response:
+                try:
+                    return response.status, await response.json(content_type=None)
+                except Exception:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.feedback(a1, api, False, response.status)
+                    raise
+
+        status, res_json = await send_with_proxies_async(send, proxies)
+        if self.rate_limiter is not None:
+            success = isinstance(res_json, dict) and res_json.get('success', False)
+            self.rate_limiter.feedback(a1, api, success, status)
+        return res_json
+
+    async def fetch(self, method: str, api: str, data, cookies_str: str, proxies: dict = None):
+        """
+            发送请求并按照 XHS_Apis 的格式返回 (success, msg, res_json)
+        """
+        res_json = None
+        try:
+            res_json = await self.request(method, api, data, cookies_str, proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def get_homefeed_all_channel(self, cookies_str: str, proxies: dict = None):
+        """
+            获取主页的所有频道
+            返回主页的所有频道
+        """
+        return await self.fetch('GET', "/api/sns/web/v1/homefeed/category", '', cookies_str, proxies)
+
+    async def get_homefeed_recommend(self, category, cursor_score, refresh_type, note_index, cookies_str: str, proxies: dict = None):
+        """
+            获取主页推荐的笔记
+            :param category: 你想要获取的频道
+            :param cursor_score: 你想要获取的笔记的cursor
+            :param refresh_type: 你想要获取的笔记的刷新类型
+            :param note_index: 你想要获取的笔记的index
+            :param cookies_str: 你的cookies
+            返回主页推荐的笔记
+        """
+        data = {
+            "cursor_score": cursor_score,
+            "num": 20,
+            "refresh_type": refresh_type,
+            "note_index": note_index,
+            "unread_begin_note_id": "",
+            "unread_end_note_id": "",
+            "unread_note_count": 0,
+            "category": category,
+            "search_key": "",
+            "need_num": 10,
+            "image_formats": [
+                "jpg",
+                "webp",
+                "avif"
+            ],
+            "need_filter_image": False
+        }
+        return await self.fetch('POST', "/api/sns/web/v1/homefeed", data, cookies_str, proxies)
+
+    def iter_homefeed_recommend(self, category, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取主页推荐的笔记，使用 async for 迭代，推荐流没有尽头，需要指定 max_items 或 stop_when
+            :param category: 你想要获取的频道
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return Async_Paginator(lambda cursor: self.get_homefeed_recommend(category, *cursor, cookies_str, proxies), parse_homefeed_page,
+                               ("", 1, 0), max_items, stop_when, prefetch=prefetch)
+
+    async def get_homefeed_recommend_by_num(self, category, require_num, cookies_str: str, proxies: dict = None):
+        """
+            根据数量获取主页推荐的笔记
+            :param category: 你想要获取的频道
+            :param require_num: 你想要获取的笔记的数量
+            :param cookies_str: 你的cookies
+            根据数量返回主页推荐的笔记
+        """
+        return await collect_async(self.iter_homefeed_recommend(category, cookies_str, proxies, max_items=require_num))
+
+    async def get_user_info(self, user_id: str, cookies_str: str, proxies: dict = None):
+        """
+            获取用户的信息
+            :param user_id: 你想要获取的用户的id
+            :param cookies_str: 你的cookies
+            返回用户的信息
+        """
+        params = {
+            "target_user_id": user_id
+        }
+        splice_api = splice_str("/api/sns/web/v1/user/otherinfo", params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    async def get_user_self_info(self, cookies_str: str, proxies: dict = None):
+        """
+            获取用户自己的信息1
+            :param cookies_str: 你的cookies
+            返回用户自己的信息1
+        """
+        return await self.fetch('GET', "/api/sns/web/v1/user/selfinfo", '', cookies_str, proxies)
+
+    async def get_user_self_info2(self, cookies_str: str, proxies: dict = None):
+        """
+            获取用户自己的信息2
+            :param cookies_str: 你的cookies
+            返回用户自己的信息2
+        """
+        return await self.fetch('GET', "/api/sns/web/v2/user/me", '', cookies_str, proxies)
+
+    async def get_user_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
+        """
+            获取用户指定位置的笔记
+            :param user_id: 你想要获取的用户的id
+            :param cursor: 你想要获取的笔记的cursor
+            :param cookies_str: 你的cookies
+            返回用户指定位置的笔记
+        """
+        params = {
+            "num": "30",
+            "cursor": cursor,
+            "user_id": user_id,
+            "image_formats": "jpg,webp,avif",
+            "xsec_token": xsec_token,
+            "xsec_source": xsec_source,
+        }
+        splice_api = splice_str("/api/sns/web/v1/user_posted", params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    def _iter_user_all(self, page_func, user_url: str, default_source: str, cookies_str: str, proxies: dict = None, filter_page=None,
+                       max_items: int = None, stop_when=None, prefetch: bool = False):
+        user_id, kvDist = parse_url(user_url)
+        xsec_token = kvDist.get('xsec_token', "")
+        xsec_source = kvDist.get('xsec_source', default_source)
+        return Async_Paginator(lambda cursor: page_func(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), cursor_page("notes"),
+                               '', max_items, stop_when, filter_page, prefetch)
+
+    def iter_user_notes(self, user_url: str, cookies_str: str, proxies: dict = None, known_note_ids=None, cutoff_time=None, max_out_of_window: int = 3,
+                        max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+           逐条获取用户的笔记，使用 async for 迭代，参数含义同 get_user_all_notes
+           :param max_items: 最多返回多少条，None 为不限
+           :param stop_when: stop_when(item) 返回True时停止翻页
+           :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_user_all(self.get_user_note_info, user_url, "pc_search", cookies_str, proxies,
+                                   user_notes_filter(known_note_ids, cutoff_time, max_out_of_window), max_items, stop_when, prefetch)
+
+    async def get_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None, known_note_ids=None, cutoff_time=None, max_out_of_window: int = 3):
+        """
+           获取用户所有笔记
+           :param user_url: 你想要获取的用户的url
+           :param cookies_str: 你的cookies
+           :param known_note_ids: 已爬取过的笔记id集合，传入时只返回新笔记，翻到只有已知笔记的页就停止
+           :param cutoff_time: datetime，只返回之后发布的笔记，根据笔记id中的时间判断
+           :param max_out_of_window: 连续多少篇笔记早于 cutoff_time 时停止翻页
+           返回用户的所有笔记
+        """
+        return await collect_async(self.iter_user_notes(user_url, cookies_str, proxies, known_note_ids, cutoff_time, max_out_of_window))
+
+    async def get_user_like_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
+        """
+            获取用户指定位置喜欢的笔记
+            :param user_id: 你想要获取的用户的id
+            :param cursor: 你想要获取的笔记的cursor
+            :param cookies_str: 你的cookies
+            返回用户指定位置喜欢的笔记
+        """
+        params = {
+            "num": "30",
+            "cursor": cursor,
+            "user_id": user_id,
+            "image_formats": "jpg,webp,avif",
+            "xsec_token": xsec_token,
+            "xsec_source": xsec_source,
+        }
+        splice_api = splice_str("/api/sns/web/v1/note/like/page", params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    def iter_user_like_notes(self, user_url: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取用户喜欢的笔记，使用 async for 迭代
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_user_all(self.get_user_like_note_info, user_url, "pc_user", cookies_str, proxies, None, max_items, stop_when, prefetch)
+
+    async def get_user_all_like_note_info(self, user_url: str, cookies_str: str, proxies: dict = None):
+        """
+            获取用户所有喜欢笔记
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            返回用户的所有喜欢笔记
+        """
+        return await collect_async(self.iter_user_like_notes(user_url, cookies_str, proxies))
+
+    async def get_user_collect_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
+        """
+            获取用户指定位置收藏的笔记
+            :param user_id: 你想要获取的用户的id
+            :param cursor: 你想要获取的笔记的cursor
+            :param cookies_str: 你的cookies
+            返回用户指定位置收藏的笔记
+        """
+        params = {
+            "num": "30",
+            "cursor": cursor,
+            "user_id": user_id,
+            "image_formats": "jpg,webp,avif",
+            "xsec_token": xsec_token,
+            "xsec_source": xsec_source,
+        }
+        splice_api = splice_str("/api/sns/web/v2/note/collect/page", params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    def iter_user_collect_notes(self, user_url: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取用户收藏的笔记，使用 async for 迭代
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_user_all(self.get_user_collect_note_info, user_url, "pc_search", cookies_str, proxies, None, max_items, stop_when, prefetch)
+
+    async def get_user_all_collect_note_info(self, user_url: str, cookies_str: str, proxies: dict = None):
+        """
+            获取用户所有收藏笔记
+            :param user_url: 你想要获取的用户的url
+            :param cookies_str: 你的cookies
+            返回用户的所有收藏笔记
+        """
+        return await collect_async(self.iter_user_collect_notes(user_url, cookies_str, proxies))
+
+    async def get_note_info(self, url: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的详细
+            :param url: 你想要获取的笔记的url
+            :param cookies_str: 你的cookies
+            返回笔记的详细
+        """
+        try:
+            note_id, kvDist = parse_url(url)
+        except Exception as e:
+            return False, str(e), None
+        data = {
+            "source_note_id": note_id,
+            "image_formats": [
+                "jpg",
+                "webp",
+                "avif"
+            ],
+            "extra": {
+                "need_body_topic": "1"
+            },
+            "xsec_source": kvDist.get('xsec_source', "pc_search"),
+            "xsec_token": kvDist.get('xsec_token', "")
+        }
+        return await self.fetch('POST', "/api/sns/web/v1/feed", data, cookies_str, proxies)
+
+    async def get_search_keyword(self, word: str, cookies_str: str, proxies: dict = None):
+        """
+            获取搜索关键词
+            :param word: 你的关键词
+            :param cookies_str: 你的cookies
+            返回搜索关键词
+        """
+        params = {
+            "keyword": urllib.parse.quote(word)
+        }
+        splice_api = splice_str("/api/sns/web/v1/search/recommend", params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    async def search_note(self, query: str, cookies_str: str, page=1, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            获取搜索笔记的结果
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            :param page 搜索的页数
+            :param sort_type_choice 排序方式 0 综合排序, 1 最新, 2 最多点赞, 3 最多评论, 4 最多收藏
+            :param note_type 笔记类型 0 不限, 1 视频笔记, 2 普通笔记
+            :param note_time 笔记时间 0 不限, 1 一天内, 2 一周内天, 3 半年内
+            :param note_range 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
+            :param pos_distance 位置距离 0 不限, 1 同城, 2 附近 指定这个必须要指定 geo
+            返回搜索的结果
+        """
+        sort_type = ["general", "time_descending", "popularity_descending", "comment_descending", "collect_descending"]
+        filter_note_type = ["不限", "视频笔记", "普通笔记"]
+        filter_note_time = ["不限", "一天内", "一周内", "半年内"]
+        filter_note_range = ["不限", "已看过", "未看过", "已关注"]
+        filter_pos_distance = ["不限", "同城", "附近"]
+
+        def choice(options, index):
+            return options[index] if 0 < index < len(options) else options[0]
+
+        if geo:
+            geo = json.dumps(geo, separators=(',', ':'))
+        data = {
+            "keyword": query,
+            "page": page,
+            "page_size": 20,
+            "search_id": generate_x_b3_traceid(21),
+            "sort": "general",
+            "note_type": 0,
+            "ext_flags": [],
+            "filters": [
+                {
+                    "tags": [
+                        choice(sort_type, sort_type_choice)
+                    ],
+                    "type": "sort_type"
+                },
+                {
+                    "tags": [
+                        choice(filter_note_type, note_type)
+                    ],
+                    "type": "filter_note_type"
+                },
+                {
+                    "tags": [
+                        choice(filter_note_time, note_time)
+                    ],
+                    "type": "filter_note_time"
+                },
+                {
+                    "tags": [
+                        choice(filter_note_range, note_range)
+                    ],
+                    "type": "filter_note_range"
+                },
+                {
+                    "tags": [
+                        choice(filter_pos_distance, pos_distance)
+                    ],
+                    "type": "filter_pos_distance"
+                }
+            ],
+            "geo": geo,
+            "image_formats": [
+                "jpg",
+                "webp",
+                "avif"
+            ]
+        }
+        return await self.fetch('POST', "/api/sns/web/v1/search/notes", data, cookies_str, proxies)
+
+    def iter_search_notes(self, query: str, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None,
+                          max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取搜索笔记的结果，使用 async for 迭代
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            参数含义同 search_note
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return Async_Paginator(lambda page: self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies),
+                               number_page("items"), 1, max_items, stop_when, prefetch=prefetch)
+
+    async def search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
+            :param query 搜索的关键词
+            :param require_num 搜索的数量
+            :param cookies_str 你的cookies
+            参数含义同 search_note
+            返回搜索的结果
+        """
+        return await collect_async(self.iter_search_notes(query, cookies_str, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies, max_items=require_num))
+
+    async def search_user(self, query: str, cookies_str: str, page=1, proxies: dict = None):
+        """
+            获取搜索用户的结果
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            :param page 搜索的页数
+            返回搜索的结果
+        """
+        data = {
+            "search_user_request": {
+                "keyword": query,
+                "search_id": "2dn9they1jbjxwawlo4xd",
+                "page": page,
+                "page_size": 15,
+                "biz_type": "web_search_user",
+                "request_id": "22471139-1723999898524"
+            }
+        }
+        return await self.fetch('POST', "/api/sns/web/v1/search/usersearch", data, cookies_str, proxies)
+
+    def iter_search_users(self, query: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取搜索用户的结果，使用 async for 迭代
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return Async_Paginator(lambda page: self.search_user(query, cookies_str, page, proxies), number_page("users"), 1, max_items, stop_when, prefetch=prefetch)
+
+    async def search_some_user(self, query: str, require_num: int, cookies_str: str, proxies: dict = None):
+        """
+            指定数量搜索用户
+            :param query 搜索的关键词
+            :param require_num 搜索的数量
+            :param cookies_str 你的cookies
+            返回搜索的结果
+        """
+        return await collect_async(self.iter_search_users(query, cookies_str, proxies, max_items=require_num))
+
+    async def get_note_out_comment(self, note_id: str, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取指定位置的笔记一级评论
+            :param note_id 笔记的id
+            :param cursor 指定位置的评论的cursor
+            :param cookies_str 你的cookies
+            返回指定位置的笔记一级评论
+        """
+        params = {
+            "note_id": note_id,
+            "cursor": cursor,
+            "top_comment_id": "",
+            "image_formats": "jpg,webp,avif",
+            "xsec_token": xsec_token
+        }
+        splice_api = splice_str(COMMENT_PAGE_API, params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    def iter_note_out_comments(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False, on_page=None):
+        """
+            逐条获取笔记的一级评论，使用 async for 迭代
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
+        """
+        return Async_Paginator(lambda cursor: self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies), cursor_page("comments"),
+                               '', max_items, stop_when, prefetch=prefetch, on_page=on_page)
+
+    async def get_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的全部一级评论
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            返回笔记的全部一级评论
+        """
+        return await collect_async(self.iter_note_out_comments(note_id, xsec_token, cookies_str, proxies))
+
+    async def get_note_inner_comment(self, comment: dict, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取指定位置的笔记二级评论
+            :param comment 笔记的一级评论
+            :param cursor 指定位置的评论的cursor
+            :param cookies_str 你的cookies
+            返回指定位置的笔记二级评论
+        """
+        params = {
+            "note_id": comment['note_id'],
+            "root_comment_id": comment['id'],
+            "num": "10",
+            "cursor": cursor,
+            "image_formats": "jpg,webp,avif",
+            "top_comment_id": '',
+            "xsec_token": xsec_token
+        }
+        splice_api = splice_str(SUB_COMMENT_PAGE_API, params)
+        return await self.fetch('GET', splice_api, '', cookies_str, proxies)
+
+    def iter_note_inner_comments(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False, on_page=None):
+        """
+            逐条获取一级评论下还没有返回的二级评论（从 sub_comment_cursor 开始），使用 async for 迭代
+            :param comment 笔记的一级评论
+            :param cookies_str 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
+        """
+        cursor = comment['sub_comment_cursor'] if comment['sub_comment_has_more'] else None
+        return Async_Paginator(lambda cursor: self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies), cursor_page("comments"),
+                               cursor, max_items, stop_when, prefetch=prefetch, on_page=on_page)
+
+    async def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, on_page=None):
+        """
+            获取笔记的全部二级评论
+            :param comment 笔记的一级评论
+            :param cookies_str 你的cookies
+            :param on_page: on_page(res_json, cursor) 每页请求成功后调用
+            返回笔记的全部二级评论
+        """
+        if not comment['sub_comment_has_more']:
+            return True, 'success', comment
+        success, msg, inner_comment_list = await collect_async(self.iter_note_inner_comments(comment, xsec_token, cookies_str, proxies, on_page=on_page))
+        if success:
+            comment['sub_comments'].extend(inner_comment_list)
+        return success, msg, comment
+
+    async def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None, max_workers: int = 2, raw_pages: list = None):
+        """
+            获取一篇文章的所有评论，每页一级评论返回后立即并发展开其中的二级评论
+            :param url: 你想要获取的笔记的url
+            :param cookies_str: 你的cookies
+            :param max_workers: 同时展开二级评论的一级评论数，都使用同一个账号；通过 Cookie_Pool.call_async 调用时整篇笔记只占用一个账号，
+                                不应超过账号的 max_concurrency
+            :param raw_pages: 传入列表时追加一级和二级评论接口每页返回的原始json，格式见 comment_page_recorder
+            返回一篇文章的所有评论，一级评论的顺序与接口返回的顺序一致
+        """
+        out_comment_list = []
+        semaphore = asyncio.Semaphore(max_workers)
+        tasks = []
+
+        async def expand(comment):
+            async with semaphore:
+                return await self.get_note_all_inner_comment(comment, xsec_token, cookies_str, proxies,
+                                                             comment_page_recorder(raw_pages, SUB_COMMENT_PAGE_API, comment['id']))
+
+        try:
+            note_id, kvDist = parse_url(url)
+            xsec_token = kvDist.get('xsec_token', '')
+            paginator = self.iter_note_out_comments(note_id, xsec_token, cookies_str, proxies, prefetch=True,
+                                                    on_page=comment_page_recorder(raw_pages, COMMENT_PAGE_API))
+            async for comment in paginator:
+                out_comment_list.append(comment)
+                if comment['sub_comment_has_more']:
+                    tasks.append(asyncio.ensure_future(expand(comment)))
+            success, msg = True, paginator.msg
+            for inner_success, inner_msg, _ in await asyncio.gather(*tasks):
+                if not inner_success:
+                    raise Exception(inner_msg)
+        except Exception as e:
+            success = False
+            msg = str(e)
+            for task in tasks:
+                task.cancel()
+            # 等待取消完成，返回后不再有请求使用这个账号
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return success, msg, out_comment_list
+
+    async def get_unread_message(self, cookies_str: str, proxies: dict = None):
+        """
+            获取未读消息
+            :param cookies_str: 你的cookies
+            返回未读消息
+        """
+        return await self.fetch('GET', "/api/sns/web/unread_count", '', cookies_str, proxies)
+
+    async def _get_message_page(self, api: str, cursor: str, cookies_str: str, proxies: dict = None):
+        params = {
+            "num": "20",
+            "cursor": cursor
+        }
+        return await self.fetch('GET', splice_str(api, params), '', cookies_str, proxies)
+
+    def _iter_message(self, page_func, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        return Async_Paginator(lambda cursor: page_func(cursor, cookies_str, proxies), cursor_page("message_list"), '', max_items, stop_when, prefetch=prefetch)
+
+    async def get_metions(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取评论和@提醒
+            :param cursor: 你想要获取的评论和@提醒的cursor
+            :param cookies_str: 你的cookies
+            返回评论和@提醒
+        """
+        return await self._get_message_page("/api/sns/web/v1/you/mentions", cursor, cookies_str, proxies)
+
+    def iter_metions(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取评论和@提醒，使用 async for 迭代
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_message(self.get_metions, cookies_str, proxies, max_items, stop_when, prefetch)
+
+    async def get_all_metions(self, cookies_str: str, proxies: dict = None):
+        """
+            获取全部的评论和@提醒
+            :param cookies_str: 你的cookies
+            返回全部的评论和@提醒
+        """
+        return await collect_async(self.iter_metions(cookies_str, proxies))
+
+    async def get_likesAndcollects(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取赞和收藏
+            :param cursor: 你想要获取的赞和收藏的cursor
+            :param cookies_str: 你的cookies
+            返回赞和收藏
+        """
+        return await self._get_message_page("/api/sns/web/v1/you/likes", cursor, cookies_str, proxies)
+
+    def iter_likesAndcollects(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取赞和收藏，使用 async for 迭代
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_message(self.get_likesAndcollects, cookies_str, proxies, max_items, stop_when, prefetch)
+
+    async def get_all_likesAndcollects(self, cookies_str: str, proxies: dict = None):
+        """
+            获取全部的赞和收藏
+            :param cookies_str: 你的cookies
+            返回全部的赞和收藏
+        """
+        return await collect_async(self.iter_likesAndcollects(cookies_str, proxies))
+
+    async def get_new_connections(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取新增关注
+            :param cursor: 你想要获取的新增关注的cursor
+            :param cookies_str: 你的cookies
+            返回新增关注
+        """
+        return await self._get_message_page("/api/sns/web/v1/you/connections", cursor, cookies_str, proxies)
+
+    def iter_new_connections(self, cookies_str: str, proxies: dict = None, max_items: int = None, stop_when=None, prefetch: bool = False):
+        """
+            逐条获取新增关注，使用 async for 迭代
+            :param cookies_str: 你的cookies
+            :param max_items: 最多返回多少条，None 为不限
+            :param stop_when: stop_when(item) 返回True时停止翻页
+            :param prefetch: 处理当前页时在后台请求下一页
+        """
+        return self._iter_message(self.get_new_connections, cookies_str, proxies, max_items, stop_when, prefetch)
+
+    async def get_all_new_connections(self, cookies_str: str, proxies: dict = None):
+        """
+            获取全部的新增关注
+            :param cookies_str: 你的cookies
+            返回全部的新增关注
+        """
+        return await collect_async(self.iter_new_connections(cookies_str, proxies))
+
+    async def get_note_no_water_video(self, note_id, proxies: dict = None):
+        """
+            获取笔记无水印视频
+            :param note_id: 你想要获取的笔记的id
+            返回笔记无水印视频
+        """
+        success = True
+        msg = '成功'
+        video_addr = None
+        try:
+            headers = get_common_headers()
+            url = f"https://www.xiaohongshu.com/explore/{note_id}"
+
+            async def send(proxies):
+                async with self.get_session().get(url, headers=headers, proxy=trans_proxies(proxies)) as response:
+                    return response.status, await response.text()
+
+            _, res = await send_with_proxies_async(send, proxies)
+            video_addr = re.findall(r'<meta name="og:video" content="(.*?)">', res)[0]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, video_addr
+
+    get_note_no_water_img = staticmethod(XHS_Apis.get_note_no_water_img)
+
+
+if __name__ == '__main__':
+    """
+        异步api的使用示例：并发获取多篇笔记的详细
+    """
+    async def main():
+        cookies_str = r''
+        note_urls = [
+            r'https://www.xiaohongshu.com/explore/67d7c713000000000900e391?xsec_token=AB1ACxbo5cevHxV_bWibTmK8R1DDz0NnAW1PbFZLABXtE=&xsec_source=pc_user',
+        ]
+        async with XHS_Async_Apis(limit=100) as xhs_apis:
+            results = await asyncio.gather(*[xhs_apis.get_note_info(url, cookies_str) for url in note_urls])
+        for url, (success, msg, note_info) in zip(note_urls, results):
+            logger.info(f'获取笔记信息结果 {url}: {success}, msg: {msg}')
+
+    asyncio.run(main())
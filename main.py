@@ -1,31 +1,79 @@
 import json
 import os
+import signal
+import threading
 import urllib.parse
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from loguru import logger
 from apis.xhs_pc_apis import XHS_Apis
-from xhs_utils.common_util import init
+from xhs_utils.checkpoint_util import DONE, Crawl_Checkpoint
+from xhs_utils.common_util import init, load_cookie_pool
+from xhs_utils.cookie_util import Cookie_Pool
+from xhs_utils.storage_util import Sqlite_Storage
+from xhs_utils.archive_util import Raw_Archive
+from xhs_utils.xhs_util import get_note_create_time
 from xhs_utils.data_util import (
     handle_note_info,
     handle_user_info,
     handle_comment_info,
     download_note,
     save_to_xlsx,
+    save_note_comments,
+    get_note_save_path,
     save_user_detail,
 )
 
 
 class Data_Spider:
-    def __init__(self):
+    def __init__(self, checkpoint: Crawl_Checkpoint = None, storage=None, archive: Raw_Archive = None):
+        """
+            :param checkpoint: 爬取进度记录，传入时 spider_user_complete_data 跳过已完成的用户和笔记
+            :param storage: 数据存储，传入时爬取到的用户、笔记和评论同时写入，可以是 Sqlite_Storage 或 Parquet_Sink
+            :param archive: 原始响应归档，传入时保存笔记详情和评论接口每页返回的完整json，之后可以离线重新处理；由调用方负责关闭
+        """
         self.xhs_apis = XHS_Apis()
+        self.checkpoint = checkpoint
+        self.storage = storage
+        self.archive = archive
+        self.stop_event = threading.Event()
+
+    def commit_storage(self):
+        """
+            checkpoint 记录完成前持久化存储中缓冲的数据，只对实现了 commit 的存储（Sqlite_Storage）生效
+            Parquet_Sink 的文件在 close 后才可读，每篇笔记写入一次只会产生大量很小的row group
+        """
+        commit = getattr(self.storage, 'commit', None)
+        if commit is not None:
+            commit()
 
-    def spider_note(self, note_url: str, cookies_str: str, proxies=None):
+    def stop(self):
+        """
+            请求停止：正在处理的笔记处理完后停止，未完成的用户下次运行时继续
+        """
+        self.stop_event.set()
+
+    def call_api(self, func, *args, cookies_str, **kwargs):
+        """
+            调用 XHS_Apis 的方法，cookies_str 可以是单个账号的cookies，也可以是 Cookie_Pool
+            传入 Cookie_Pool 时每次调用都会选择当前最健康的空闲账号
+        """
+        if isinstance(cookies_str, Cookie_Pool):
+            return cookies_str.call(func, *args, **kwargs)
+        return func(*args, cookies_str=cookies_str, **kwargs)
+
+    def spider_note(self, note_url: str, cookies_str: str, proxies=None, request_params: tuple = None):
         note_info = None
         try:
-            success, msg, note_info = self.xhs_apis.get_note_info(note_url, cookies_str, proxies)
+            if request_params is not None:
+                success, msg, note_info = self.xhs_apis.get_note_info(note_url, cookies_str, proxies, request_params)
+            else:
+                success, msg, note_info = self.call_api(self.xhs_apis.get_note_info, note_url, cookies_str=cookies_str, proxies=proxies)
             if success:
+                if self.archive is not None:
+                    self.archive.append(note_info["data"]["items"][0]["id"], note_info, url=note_url)
                 note_info = note_info["data"]["items"][0]
                 note_info["url"] = note_url
                 note_info = handle_note_info(note_info)
@@ -35,40 +83,65 @@ class Data_Spider:
         logger.info(f"爬取笔记信息 {note_url}: {success}, msg: {msg}")
         return success, msg, note_info
 
-    def spider_some_note(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None):
+    def spider_some_note(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None, max_workers: int = 1, download_video: bool = False):
         """
         爬取一些笔记的信息
         :param notes:
-        :param cookies_str:
+        :param cookies_str: 单个账号的cookies或 Cookie_Pool，使用账号池时吞吐随账号数增加
         :param base_path:
+        :param max_workers: 同时爬取的笔记数量，每篇笔记获取详情后立即下载媒体，结果保持输入顺序
+        :param download_video: 视频笔记是否下载视频文件，默认只保存封面
         :return:
         """
         if (save_choice == 'all' or save_choice == 'excel') and excel_name == '':
             raise ValueError('excel_name 不能为空')
-        note_list = []
-        for note_url in notes:
-            success, msg, note_info = self.spider_note(note_url, cookies_str, proxies)
-            if note_info is not None and success:
-                note_list.append(note_info)
-        for note_info in note_list:
-            if save_choice == 'all' or 'media' in save_choice:
-                download_note(note_info, base_path['media'], save_choice)
+        need_media = save_choice == 'all' or 'media' in save_choice
+
+        def spider_and_download(note_url, request_params=None):
+            success, msg, note_info = self.spider_note(note_url, cookies_str, proxies, request_params)
+            if note_info is not None and success and need_media:
+                try:
+                    download_note(note_info, base_path['media'], save_choice, download_video)
+                except Exception as e:
+                    logger.warning(f'下载笔记媒体失败 {note_url}: {e}')
+            return success, note_info
+
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            if isinstance(cookies_str, Cookie_Pool) or max_workers <= 1:
+                results = list(executor.map(spider_and_download, notes))
+            else:
+                # 单账号并发时每批笔记的签名一次生成；分批生成，发送时签名中的时间戳不会过旧
+                results = []
+                batch_size = max_workers * 2
+                for start in range(0, len(notes), batch_size):
+                    batch = notes[start:start + batch_size]
+                    try:
+                        params_list = self.xhs_apis.generate_note_info_params(batch, cookies_str)
+                    except Exception as e:
+                        logger.warning(f'批量签名失败，逐个签名: {e}')
+                        params_list = [None] * len(batch)
+                    results.extend(executor.map(spider_and_download, batch, params_list))
+        note_list = [note_info for success, note_info in results if note_info is not None and success]
+        if self.storage is not None:
+            self.storage.save_notes(note_list)
         if save_choice == 'all' or save_choice == 'excel':
             file_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx'))
             save_to_xlsx(note_list, file_path)
 
 
-    def spider_user_all_note(self, user_url: str, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None):
+    def spider_user_all_note(self, user_url: str, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None, max_workers: int = 1, download_video: bool = False):
         """
         爬取一个用户的所有笔记
         :param user_url:
         :param cookies_str:
         :param base_path:
+        :param max_workers: 同时爬取的笔记数量
+        :param download_video: 视频笔记是否下载视频文件
         :return:
         """
         note_list = []
         try:
-            success, msg, all_note_info = self.xhs_apis.get_user_all_notes(user_url, cookies_str, proxies)
+            success, msg, all_note_info = self.call_api(self.xhs_apis.get_user_all_notes, user_url, cookies_str=cookies_str, proxies=proxies)
             if success:
                 logger.info(f'用户 {user_url} 作品数量: {len(all_note_info)}')
                 for simple_note_info in all_note_info:
@@ -76,14 +149,14 @@ class Data_Spider:
                     note_list.append(note_url)
             if save_choice == 'all' or save_choice == 'excel':
                 excel_name = user_url.split('/')[-1].split('?')[0]
-            self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, proxies)
+            self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, proxies, max_workers, download_video)
         except Exception as e:
             success = False
             msg = e
         logger.info(f'爬取用户所有视频 {user_url}: {success}, msg: {msg}')
         return note_list, success, msg
 
-    def spider_some_search_note(self, query: str, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None,  excel_name: str = '', proxies=None):
+    def spider_some_search_note(self, query: str, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None,  excel_name: str = '', proxies=None, max_workers: int = 1, download_video: bool = False):
         """
             指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
             :param query 搜索的关键词
@@ -95,11 +168,13 @@ class Data_Spider:
             :param note_time 笔记时间 0 不限, 1 一天内, 2 一周内天, 3 半年内
             :param note_range 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
             :param pos_distance 位置距离 0 不限, 1 同城, 2 附近 指定这个必须要指定 geo
+            :param max_workers 同时爬取的笔记数量
+            :param download_video 视频笔记是否下载视频文件
             返回搜索的结果
         """
         note_list = []
         try:
-            success, msg, notes = self.xhs_apis.search_some_note(query, require_num, cookies_str, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
+            success, msg, notes = self.call_api(self.xhs_apis.search_some_note, query, require_num, cookies_str=cookies_str, sort_type_choice=sort_type_choice, note_type=note_type, note_time=note_time, note_range=note_range, pos_distance=pos_distance, geo=geo, proxies=proxies)
             if success:
                 notes = list(filter(lambda x: x['model_type'] == "note", notes))
                 logger.info(f'搜索关键词 {query} 笔记数量: {len(notes)}')
@@ -108,7 +183,7 @@ class Data_Spider:
                     note_list.append(note_url)
             if save_choice == 'all' or save_choice == 'excel':
                 excel_name = query
-            self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, proxies)
+            self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, proxies, max_workers, download_video)
         except Exception as e:
             success = False
             msg = e
@@ -124,8 +199,12 @@ class Data_Spider:
         excel_name: str = "",
         proxies=None,
         days_limit: int = 365,  # 默认只爬取最近365天（近一年），设为 None 爬全部
+        download_video: bool = False,  # 视频笔记是否下载视频文件，默认只保存封面
+        incremental: bool = False,  # 配合checkpoint使用，已完成的用户只获取新发布的笔记
+        max_out_of_window: int = 5,  # 翻页时连续多少篇（不含置顶）早于时间范围就停止
     ):
         user_info = None
+        user_id = None
         note_list = []
         all_comments = []
         success = False
@@ -141,14 +220,23 @@ class Data_Spider:
                 user_url = f"https://www.xiaohongshu.com/user/profile/{user_id}"
                 logger.warning("仅提供user_id，将尝试构造URL")
 
+            checkpoint = self.checkpoint
+            user_state = checkpoint.get_user(user_id) if checkpoint is not None else None
+            refresh = incremental and user_state is not None and user_state["status"] == DONE and user_state["note_list"] is not None
+            if checkpoint is not None and checkpoint.should_skip_user(user_state) and not refresh:
+                logger.info(f"用户 {user_id} 已处理过 ({user_state['status']}，失败 {user_state['fail_count']} 次)，跳过")
+                return user_info, note_list, all_comments, user_state["status"] == DONE, "已处理过，跳过"
+
             logger.info(f"开始爬取用户: {user_id}")
             logger.info(f"时间过滤: {'最近 ' + str(days_limit) + ' 天' if days_limit else '全部笔记'}")
 
             # 2. 获取用户信息
-            success, msg, user_info_raw = self.xhs_apis.get_user_info(user_id, cookies_str, proxies)
+            success, msg, user_info_raw = self.call_api(self.xhs_apis.get_user_info, user_id, cookies_str=cookies_str, proxies=proxies)
             if not success:
                 raise Exception(f"获取用户信息失败: {msg}")
             user_info = handle_user_info(user_info_raw["data"], user_id)
+            if self.storage is not None:
+                self.storage.save_users([user_info])
             logger.info(f"✓ 用户信息获取成功: {user_info['nickname']}")
 
             # 保存用户信息
@@ -159,34 +247,88 @@ class Data_Spider:
                 save_to_xlsx([user_info], user_excel_path, type="user")
                 logger.info(f"✓ 用户信息已保存: {user_excel_path}")
 
-            # 3. 获取所有笔记列表
-            success, msg, all_note_info = self.xhs_apis.get_user_all_notes(user_url, cookies_str, proxies)
-            if not success:
-                raise Exception(f"获取笔记列表失败: {msg}")
-            logger.info(f"✓ 原始找到 {len(all_note_info)} 篇笔记")
-
-            # 时间范围下限（仅用于“最终上传时间”判断）
+            # 时间范围下限：翻页时按笔记id中的发布时间提前过滤，请求详情后再按上传时间做最终判断
             cutoff_time = None
+            cutoff_timestamp = None
             if days_limit is not None:
                 cutoff_time = datetime.now() - timedelta(days=days_limit)
+                cutoff_timestamp = cutoff_time.timestamp()
                 logger.info(f"✓ 将按上传时间过滤，只保留最近 {days_limit} 天的笔记")
 
+            # 3. 获取所有笔记列表，续爬时使用上次保存的列表，增量更新时只翻到已知笔记为止
+            note_list_changed = True
+            if refresh:
+                known_note_ids = {note["note_id"] for note in user_state["note_list"]}
+                success, msg, new_note_info = self.call_api(self.xhs_apis.get_user_all_notes, user_url, cookies_str=cookies_str, proxies=proxies,
+                                                            known_note_ids=known_note_ids, cutoff_time=cutoff_time, max_out_of_window=max_out_of_window)
+                if not success:
+                    raise Exception(f"获取笔记列表失败: {msg}")
+                all_note_info = new_note_info + user_state["note_list"]
+                logger.info(f"✓ 增量更新找到 {len(new_note_info)} 篇新笔记，共 {len(all_note_info)} 篇")
+            elif user_state is not None and user_state["note_list"] is not None:
+                all_note_info = user_state["note_list"]
+                note_list_changed = False
+                logger.info(f"✓ 继续上次的进度，共 {len(all_note_info)} 篇笔记，上次处理到 {user_state['last_cursor']}")
+            else:
+                success, msg, all_note_info = self.call_api(self.xhs_apis.get_user_all_notes, user_url, cookies_str=cookies_str, proxies=proxies,
+                                                            cutoff_time=cutoff_time, max_out_of_window=max_out_of_window)
+                if not success:
+                    raise Exception(f"获取笔记列表失败: {msg}")
+                logger.info(f"✓ 原始找到 {len(all_note_info)} 篇笔记")
+            if checkpoint is not None:
+                checkpoint.start_user(user_id)
+                if note_list_changed:
+                    checkpoint.save_user_note_list(user_id, [
+                        {"note_id": note["note_id"], "xsec_token": note.get("xsec_token", "")} for note in all_note_info
+                    ])
+
             # 4. 遍历笔记：每篇只请求两次（详情 + 评论），媒体立即下载
-            note_id_set = set()
+            note_folders = {}  # 笔记id -> 媒体文件夹，用于保存每篇笔记的评论
+            stopped = False
             for idx, simple_note_info in enumerate(all_note_info, 1):
+                if self.stop_event.is_set():
+                    stopped = True
+                    logger.warning("收到停止请求，剩余笔记下次运行时继续")
+                    break
                 note_id = simple_note_info["note_id"]
-                note_id_set.add(note_id)
                 xsec_token = simple_note_info.get("xsec_token", "")
                 note_url = f"https://www.xiaohongshu.com/explore/{note_id}?xsec_token={xsec_token}"
                 logger.info(f"[{idx}/{len(all_note_info)}] 处理笔记 {note_id}")
 
+                # 已完成的笔记直接使用保存的数据，不再请求
+                if checkpoint is not None:
+                    note_state = checkpoint.get_note(note_id)
+                    if checkpoint.should_skip_note(note_state):
+                        if note_state["note_info"] is not None:
+                            note_list.append(note_state["note_info"])
+                            all_comments.extend(note_state["comments"])
+                            # 上次运行可能在写入存储前中断，存储是upsert，重复写入没有影响
+                            if self.storage is not None:
+                                self.storage.save_notes([note_state["note_info"]])
+                                if note_state["comments"]:
+                                    self.storage.save_comments(note_state["comments"], note_user_id=user_id)
+                        logger.info(f" - 已处理过 ({note_state['status']})，跳过")
+                        continue
+
+                # 笔记id中的发布时间已经早于时间范围时不请求详情和评论（续爬或增量时保存的列表可能包含这些笔记）
+                create_time = get_note_create_time(note_id)
+                if cutoff_timestamp is not None and create_time is not None and create_time < cutoff_timestamp:
+                    logger.info(f"  - 跳过笔记 {note_id}，发布时间不在最近 {days_limit} 天内")
+                    if checkpoint is not None:
+                        checkpoint.skip_note(note_id, user_id, "不在时间范围内")
+                    continue
+
                 # === 第一次请求：获取笔记详情 ===
                 try:
-                    success_note, _, note_info_raw = self.xhs_apis.get_note_info(note_url, cookies_str, proxies)
+                    success_note, msg_note, note_info_raw = self.call_api(self.xhs_apis.get_note_info, note_url, cookies_str=cookies_str, proxies=proxies)
                     if not success_note or not note_info_raw.get("data", {}).get("items"):
                         logger.warning(" ✗ 笔记详情获取失败")
+                        if checkpoint is not None:
+                            checkpoint.fail_note(note_id, user_id, f"笔记详情获取失败: {msg_note}")
                         continue
 
+                    if self.archive is not None:
+                        self.archive.append(note_id, note_info_raw, url=note_url)
                     raw_item = note_info_raw["data"]["items"][0]
                     raw_item["url"] = note_url
                     note_info = handle_note_info(raw_item)
@@ -199,44 +341,69 @@ class Data_Spider:
                                 logger.info(
                                     f"  - 跳过笔记 {note_id}，上传时间 {note_info['upload_time']} 不在最近 {days_limit} 天内"
                                 )
+                                if checkpoint is not None:
+                                    checkpoint.skip_note(note_id, user_id, "不在时间范围内")
                                 continue
                         except Exception as e:
                             logger.warning(f"  - 上传时间解析失败，仍保留该笔记: {e}")
 
                     note_list.append(note_info)
+                    if self.storage is not None:
+                        self.storage.save_notes([note_info])
                     logger.info(f" ✓ 笔记详情成功: {note_info['title'][:30]}...")
 
                     # 立即下载媒体（利用刚获取的最新 note_info，无需二次请求）
                     if save_choice == "all" or "media" in save_choice:
                         try:
-                            download_note(note_info, base_path["media"], save_choice)
+                            note_folders[note_id] = download_note(note_info, base_path["media"], save_choice, download_video)
                             logger.info(f" ✓ 媒体下载完成")
                         except Exception as e:
                             logger.warning(f" ✗ 媒体下载失败: {e}")
 
                 except Exception as e:
                     logger.error(f" ✗ 笔记详情异常: {e}")
+                    if checkpoint is not None:
+                        checkpoint.fail_note(note_id, user_id, f"笔记详情异常: {e}")
                     continue
 
                 # === 第二次请求：获取全部评论 ===
+                note_comments = []
                 try:
-                    success_comment, _, comments_raw = self.xhs_apis.get_note_all_comment(note_url, cookies_str, proxies)
+                    raw_pages = [] if self.archive is not None else None
+                    success_comment, msg_comment, comments_raw = self.call_api(self.xhs_apis.get_note_all_comment, note_url, cookies_str=cookies_str, proxies=proxies, raw_pages=raw_pages)
+                    if success_comment and self.archive is not None:
+                        # 保存评论接口每页的原始响应，archive_comments 可以离线重建 comments_raw
+                        self.archive.append(note_id, raw_pages, kind="comment_pages", url=note_url)
                     if success_comment and comments_raw:
-                        comment_count = 0
                         for comment_raw in comments_raw:
                             comment_raw["note_id"] = note_id
                             comment_raw["note_url"] = note_url
-                            all_comments.append(handle_comment_info(comment_raw))
-                            comment_count += 1
+                            note_comments.append(handle_comment_info(comment_raw))
                             if comment_raw.get("sub_comments"):
                                 for sub in comment_raw["sub_comments"]:
                                     sub["note_id"] = note_id
                                     sub["note_url"] = note_url
-                                    all_comments.append(handle_comment_info(sub))
-                                    comment_count += 1
-                        logger.info(f" ✓ 获取 {comment_count} 条评论")
+                                    note_comments.append(handle_comment_info(sub))
+                        logger.info(f" ✓ 获取 {len(note_comments)} 条评论")
+                    # 先持久化存储再记录完成，存储不会落后于checkpoint
+                    if self.storage is not None and note_comments:
+                        self.storage.save_comments(note_comments, note_user_id=user_id)
+                    self.commit_storage()
+                    if checkpoint is not None:
+                        if success_comment:
+                            checkpoint.finish_note(note_id, user_id, note_info, note_comments)
+                        else:
+                            checkpoint.fail_note(note_id, user_id, f"获取评论失败: {msg_comment}")
                 except Exception as e:
                     logger.error(f" ✗ 获取评论异常: {e}")
+                    if checkpoint is not None:
+                        checkpoint.fail_note(note_id, user_id, f"获取评论异常: {e}")
+                all_comments.extend(note_comments)
+                if checkpoint is not None:
+                    checkpoint.set_user_cursor(user_id, note_id)
+
+            if stopped:
+                return user_info, note_list, all_comments, False, "已停止，下次运行时继续"
 
             # 5. 保存笔记总表
             if note_list and (save_choice == "all" or save_choice == "excel"):
@@ -244,43 +411,18 @@ class Data_Spider:
                 save_to_xlsx(note_list, note_excel_path, type="note")
                 logger.info(f"✓ 笔记总表已保存: {note_excel_path}")
 
-            # 6. 保存每个笔记的独立评论Excel（匹配媒体文件夹）
+            # 6. 保存每个笔记的独立评论Excel（按笔记id找到媒体文件夹）
             if (save_choice == "all" or save_choice == "excel") and all_comments:
-                media_root = base_path["media"]
-                matched_count = 0
-                remaining_ids = note_id_set.copy()
-
-                if os.path.exists(media_root):
-                    for user_folder_name in os.listdir(media_root):
-                        user_folder_path = os.path.join(media_root, user_folder_name)
-                        if not os.path.isdir(user_folder_path):
-                            continue
-                        for note_folder_name in os.listdir(user_folder_path):
-                            note_folder_path = os.path.join(user_folder_path, note_folder_name)
-                            if not os.path.isdir(note_folder_path):
-                                continue
-
-                            matched_note_id = None
-                            for nid in remaining_ids:
-                                if nid in note_folder_name:
-                                    matched_note_id = nid
-                                    break
-
-                            if matched_note_id:
-                                note_comments = [c for c in all_comments if c["note_id"] == matched_note_id]
-                                if note_comments:
-                                    comment_path = os.path.join(note_folder_path, "评论.xlsx")
-                                    try:
-                                        save_to_xlsx(note_comments, comment_path, type="comment")
-                                        logger.info(f"✓ 笔记 {matched_note_id} 评论已保存 ({len(note_comments)}条)")
-                                        matched_count += 1
-                                    except Exception as e:
-                                        logger.error(f"✗ 评论保存失败 {matched_note_id}: {e}")
-                                remaining_ids.remove(matched_note_id)
-
-                logger.info(f"✓ 本次成功为 {matched_count} 篇笔记保存独立评论文件")
-                if remaining_ids:
-                    logger.warning(f"未匹配到媒体文件夹的笔记: {remaining_ids}")
+                # 续爬时从保存的数据恢复的笔记没有经过本次下载，按相同规则计算文件夹
+                for note_info in note_list:
+                    if note_info["note_id"] not in note_folders:
+                        save_path = get_note_save_path(note_info, base_path["media"])
+                        if os.path.isdir(save_path):
+                            note_folders[note_info["note_id"]] = save_path
+                saved_ids, missing_ids = save_note_comments(all_comments, note_folders)
+                logger.info(f"✓ 本次成功为 {len(saved_ids)} 篇笔记保存独立评论文件")
+                if missing_ids:
+                    logger.warning(f"未找到媒体文件夹的笔记: {missing_ids}")
 
             # 7. 保存评论汇总表
             if all_comments and (save_choice == "all" or save_choice == "excel"):
@@ -290,11 +432,22 @@ class Data_Spider:
 
             success = True
             msg = f"成功: 笔记{len(note_list)}篇, 评论{len(all_comments)}条"
+            if checkpoint is not None:
+                retryable = checkpoint.count_retryable_notes(user_id)
+                if retryable:
+                    # 用户保持running状态，下次运行时只重试失败的笔记
+                    success = False
+                    msg = f"{retryable} 篇笔记失败，下次运行时重试; 笔记{len(note_list)}篇, 评论{len(all_comments)}条"
+                else:
+                    self.commit_storage()
+                    checkpoint.finish_user(user_id)
 
         except Exception as e:
             success = False
             msg = f"失败: {str(e)}"
             logger.error(msg)
+            if self.checkpoint is not None and user_id is not None:
+                self.checkpoint.fail_user(user_id, msg)
 
         return user_info, note_list, all_comments, success, msg
 
@@ -320,7 +473,18 @@ def load_user_ids_from_file(file_path="user_ids.txt"):
 
 if __name__ == "__main__":
     cookies_str, base_path = init()
-    data_spider = Data_Spider()
+    # 配置了多个账号时使用账号池轮换
+    if os.getenv('COOKIES_FILE') or len((cookies_str or '').splitlines()) > 1:
+        cookies_str = load_cookie_pool()
+    # 爬取进度保存在 datas/crawl_state.db，中断后再次运行会跳过已完成的用户和笔记
+    checkpoint = Crawl_Checkpoint(os.path.join(os.path.dirname(base_path['media']), 'crawl_state.db'))
+    # 爬取到的数据同时写入 datas/xhs_data.db，可用 storage_util.export_xlsx 重新导出表格
+    storage = Sqlite_Storage(os.path.join(os.path.dirname(base_path['media']), 'xhs_data.db'))
+    # 需要保存原始响应以便离线重新处理时，改为 archive = Raw_Archive(os.path.join(os.path.dirname(base_path['media']), 'raw_archive'))
+    archive = None
+    data_spider = Data_Spider(checkpoint=checkpoint, storage=storage, archive=archive)
+    # 收到SIGTERM时处理完当前笔记再退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: data_spider.stop())
 
     save_choice = "all"
 
@@ -336,30 +500,41 @@ if __name__ == "__main__":
     logger.info(f"开始批量爬取 {total} 个用户（默认仅近1年笔记）")
     logger.info("=" * 60)
 
-    for idx, user_input in enumerate(user_ids, 1):
-        logger.info(f"\n{'='*60}")
-        logger.info(f"[{idx}/{total}] 处理用户: {user_input}")
-        logger.info(f"{'='*60}")
-
-        try:
-            _, _, _, success, msg = data_spider.spider_user_complete_data(
-                user_input,
-                cookies_str,
-                base_path,
-                save_choice=save_choice,
-                days_limit=365,        # 修改这里控制时间范围，None 为全部
-            )
-            if success:
-                success_count += 1
-                logger.info("✓ 本用户爬取成功")
-            else:
+    # Ctrl-C 或异常退出时也要写入存储中缓冲的数据并关闭数据库
+    try:
+        for idx, user_input in enumerate(user_ids, 1):
+            if data_spider.stop_event.is_set():
+                logger.warning("收到停止请求，剩余用户下次运行时继续")
+                break
+            logger.info(f"\n{'='*60}")
+            logger.info(f"[{idx}/{total}] 处理用户: {user_input}")
+            logger.info(f"{'='*60}")
+
+            try:
+                _, _, _, success, msg = data_spider.spider_user_complete_data(
+                    user_input,
+                    cookies_str,
+                    base_path,
+                    save_choice=save_choice,
+                    days_limit=365,        # 修改这里控制时间范围，None 为全部
+                    incremental=False,     # 设为 True 时已爬完的用户只获取新发布的笔记，适合每日更新
+                )
+                if success:
+                    success_count += 1
+                    logger.info("✓ 本用户爬取成功")
+                else:
+                    fail_count += 1
+                    logger.error(f"✗ 本用户爬取失败: {msg}")
+            except Exception as e:
                 fail_count += 1
-                logger.error(f"✗ 本用户爬取失败: {msg}")
-        except Exception as e:
-            fail_count += 1
-            logger.error(f"✗ 处理异常: {e}")
-
-    logger.info("\n" + "=" * 60)
-    logger.info("批量爬取完成！")
-    logger.info(f"总计: {total}  成功: {success_count}  失败: {fail_count}")
-    logger.info("=" * 60)
\ No newline at end of file
+                logger.error(f"✗ 处理异常: {e}")
+
+        logger.info("\n" + "=" * 60)
+        logger.info("批量爬取完成！")
+        logger.info(f"总计: {total}  成功: {success_count}  失败: {fail_count}")
+        logger.info("=" * 60)
+    finally:
+        storage.close()
+        if archive is not None:
+            archive.close()
+        checkpoint.close()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from loguru import logger
+from dotenv import load_dotenv
+from xhs_utils.sign_util import create_local_sign_worker
+
+"""
+    本机签名服务，同一台机器上的多个爬虫进程共用一个已预热的签名进程（池）
+    启动: python sign_server.py --port 5005
+    爬虫进程在.env中设置 XHS_SIGN_SERVER=http://127.0.0.1:5005 后即通过该服务签名
+    接口:
+        POST /call       {"script": "xs", "func": "get_request_headers_params", "args": [...]}
+        POST /call_many  {"batch": [{"script": ..., "func": ..., "args": [...]}, ...]}
+        GET  /ping
+"""
+
+
+class Sign_Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    sign_worker = None
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/ping':
+            self._reply(200, {'ok': True})
+        else:
+            self._reply(404, {'ok': False, 'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            req = json.loads(self.rfile.read(length))
+            if self.path == '/call':
+                result = self.sign_worker.call(req['script'], req['func'], *req.get('args', []))
+                self._reply(200, {'ok': True, 'result': result})
+            elif self.path == '/call_many':
+                calls = [(item['script'], item['func'], item.get('args', [])) for item in req['batch']]
+                self._reply(200, {'ok': True, 'results': self.sign_worker.call_many(calls)})
+            else:
+                self._reply(404, {'ok': False, 'error': f'unknown path {self.path}'})
+        except Exception as e:
+            self._reply(500, {'ok': False, 'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_sign_server(host='127.0.0.1', port=5005):
+    sign_worker = create_local_sign_worker()
+    # 启动时先预热每个签名进程，之后的请求都不再有加载开销
+    for worker in getattr(sign_worker, 'workers', [sign_worker]):
+        worker.call('xray', 'traceId')
+    Sign_Handler.sign_worker = sign_worker
+    server = ThreadingHTTPServer((host, port), Sign_Handler)
+    server.daemon_threads = True
+    logger.info(f'签名服务已启动 http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sign_worker.close()
+        logger.info('签名服务已关闭')
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='小红书本机签名服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    args = parser.parse_args()
+    run_sign_server(args.host, args.port)
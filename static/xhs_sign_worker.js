@@ -0,0 +1,56 @@
+// 常驻签名进程：启动时只加载一次签名脚本，之后通过 stdin/stdout 按行收发 JSON
+// 请求: {"id": 1, "script": "xs", "func": "get_request_headers_params", "args": [...]}
+// 响应: {"id": 1, "ok": true, "result": ...} 或 {"id": 1, "ok": false, "error": "..."}
+// 批量请求: {"id": 2, "batch": [{"script": ..., "func": ..., "args": [...]}, ...]}
+// 批量响应: {"id": 2, "ok": true, "results": [{"ok": true, "result": ...}, ...]}
+// 用法: node xhs_sign_worker.js （由 xhs_utils/sign_util.py 启动，无需手动运行）
+
+const readline = require("readline");
+
+// xray 的 webpack 加载器会 console.log 模块 id，会污染 stdout 上的协议，这里直接屏蔽
+console.log = function () {};
+
+const scripts = {
+  xs: require("./xhs_xs_xsc_56.js"),
+  xray: require("./xhs_xray.js"),
+  creator: require("./xhs_creator_xs.js"),
+};
+
+function handle(req) {
+  const script = scripts[req.script];
+  if (!script || typeof script[req.func] !== "function") {
+    throw new Error(`unknown function ${req.script}.${req.func}`);
+  }
+  return script[req.func](...(req.args || []));
+}
+
+function handleBatch(batch) {
+  return batch.map((req) => {
+    try {
+      return { ok: true, result: handle(req) };
+    } catch (e) {
+      return { ok: false, error: String(e && e.stack ? e.stack : e) };
+    }
+  });
+}
+
+function reply(res) {
+  process.stdout.write(JSON.stringify(res) + "\n");
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+rl.on("line", (line) => {
+  if (!line.trim()) return;
+  let req;
+  try {
+    req = JSON.parse(line);
+    if (Array.isArray(req.batch)) {
+      reply({ id: req.id, ok: true, results: handleBatch(req.batch) });
+    } else {
+      reply({ id: req.id, ok: true, result: handle(req) });
+    }
+  } catch (e) {
+    reply({ id: req ? req.id : null, ok: false, error: String(e && e.stack ? e.stack : e) });
+  }
+});
+rl.on("close", () => process.exit(0));
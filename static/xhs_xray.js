@@ -445,3 +445,18 @@ traceId = function() {
     var t, e, r, s = arguments.length > 0 && void 0 !== arguments[0] ? arguments[0] : i();
     return o(t = "".concat(n(e = u.fromNumber(s, !0).shiftLeft(23).or(a.Int.seq()).toString(16)).call(e, 16, "0"))).call(t, n(r = new u(a.Int.random(32),a.Int.random(32),!0).toString(16)).call(r, 16, "0"))
 }
+
+// 批量生成 traceId，一次调用返回 num 个，减少与python之间的往返
+traceIds = function(num) {
+    var ids = [];
+    for (var k = 0; k < num; k++)
+        ids.push(traceId());
+    return ids
+}
+
+if (typeof module !== "undefined") {
+  module.exports = {
+    traceId,
+    traceIds,
+  };
+}
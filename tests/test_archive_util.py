@@ -0,0 +1,49 @@
+import copy
+
+from apis.xhs_pc_apis import XHS_Apis
+from xhs_utils.archive_util import Raw_Archive, archive_comments
+
+NOTE_URL = 'https://www.xiaohongshu.com/explore/67d7c713000000000900e391?xsec_token=abc'
+
+
+def make_comment(comment_id: str, sub_ids=(), has_more: bool = False):
+    return {
+        'id': comment_id,
+        'content': comment_id,
+        'sub_comments': [{'id': sub_id, 'content': sub_id} for sub_id in sub_ids],
+        'sub_comment_has_more': has_more,
+        'sub_comment_cursor': sub_ids[-1] if sub_ids else '',
+    }
+
+
+# 一级评论两页，c1 的二级评论还有两页
+OUT_PAGES = {
+    '': {'comments': [make_comment('c1', ['s1'], True), make_comment('c2')], 'cursor': 'p2', 'has_more': True},
+    'p2': {'comments': [make_comment('c3', ['s5'])], 'cursor': '', 'has_more': False},
+}
+SUB_PAGES = {
+    's1': {'comments': [{'id': 's2'}, {'id': 's3'}], 'cursor': 's3', 'has_more': True},
+    's3': {'comments': [{'id': 's4'}], 'cursor': '', 'has_more': False},
+}
+
+
+def response(data: dict):
+    return {'success': True, 'msg': '成功', 'data': copy.deepcopy(data)}
+
+
+def test_replay_comment_pages(tmp_path):
+    xhs_apis = XHS_Apis()
+    xhs_apis.get_note_out_comment = lambda note_id, cursor, *args: (True, '成功', response(OUT_PAGES[cursor]))
+    xhs_apis.get_note_inner_comment = lambda comment, cursor, *args: (True, '成功', response(SUB_PAGES[cursor]))
+    raw_pages = []
+    success, msg, comments = xhs_apis.get_note_all_comment(NOTE_URL, 'a1=test', raw_pages=raw_pages)
+    assert success
+    assert len(raw_pages) == 4
+    assert [sub['id'] for sub in comments[0]['sub_comments']] == ['s1', 's2', 's3', 's4']
+
+    archive = Raw_Archive(str(tmp_path / 'raw_archive'))
+    try:
+        archive.append('n1', raw_pages, kind='comment_pages', url=NOTE_URL)
+        assert archive_comments(archive.get('n1', kind='comment_pages')) == comments
+    finally:
+        archive.close()
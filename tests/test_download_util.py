@@ -0,0 +1,121 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xhs_utils.download_util import Download_Manager
+
+CONTENT = os.urandom(200 * 1024)
+CUT_AT = 70 * 1024
+CHUNK_SIZE = 16 * 1024
+# 连接中断时最后一个不完整的块不会写入，从之前完整的块之后继续
+RESUME_AT = CUT_AT // CHUNK_SIZE * CHUNK_SIZE
+
+
+class Media_Handler(BaseHTTPRequestHandler):
+    """
+        模拟CDN: 支持 HEAD 和 Range/If-Range，第一次完整的GET在 CUT_AT 字节后断开连接
+    """
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status: int, length: int, content_range: str = None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if content_range is not None:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', dict(self.headers)))
+        self._send_headers(200, len(self.server.content))
+
+    def do_GET(self):
+        self.server.requests.append(('GET', dict(self.headers)))
+        content = self.server.content
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == self.server.etag):
+            start = int(range_header[len('bytes='):].split('-')[0])
+            self._send_headers(206, len(content) - start, f'bytes {start}-{len(content) - 1}/{len(content)}')
+            self.wfile.write(content[start:])
+            return
+        self._send_headers(200, len(content))
+        if self.server.cut:
+            self.server.cut = False
+            self.wfile.write(content[:CUT_AT])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Media_Handler)
+    server.content = CONTENT
+    server.etag = '"v1"'
+    server.cut = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager():
+    manager = Download_Manager(max_workers=2, chunk_size=CHUNK_SIZE, retries=3, backoff=0.01, max_backoff=0.05, timeout=5)
+    yield manager
+    manager.close()
+
+
+def get_requests(server):
+    return [headers for method, headers in server.requests if method == 'GET']
+
+
+def test_resume_after_connection_cut(server, manager, tmp_path):
+    url = f'http://127.0.0.1:{server.server_port}/media.jpg'
+    file_path = str(tmp_path / 'media.jpg')
+    assert manager.download(url, file_path) == len(CONTENT)
+    with open(file_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(file_path + '.part')
+    gets = get_requests(server)
+    assert len(gets) == 2
+    assert 'Range' not in gets[0]
+    assert gets[1]['Range'] == f'bytes={RESUME_AT}-'
+    assert gets[1]['If-Range'] == '"v1"'
+
+    # 大小和ETag与服务器一致，不再下载
+    server.requests.clear()
+    assert manager.download(url, file_path) == 0
+    assert get_requests(server) == []
+
+
+def test_restart_when_etag_changed(server, manager, tmp_path):
+    url = f'http://127.0.0.1:{server.server_port}/media.jpg'
+    file_path = str(tmp_path / 'media.jpg')
+    with pytest.raises(Exception):
+        manager._fetch(url, file_path + '.part')
+    assert os.path.getsize(file_path + '.part') == RESUME_AT
+
+    # 文件在两次请求之间变化，If-Range 不匹配时服务器返回完整的新文件
+    server.content = os.urandom(150 * 1024)
+    server.etag = '"v2"'
+    assert manager.download(url, file_path) == len(server.content)
+    with open(file_path, 'rb') as f:
+        assert f.read() == server.content
+    gets = get_requests(server)
+    assert gets[-1]['If-Range'] == '"v1"'
+
+    # 服务器上的文件再次变化后，ETag不一致，重新下载
+    server.content = CONTENT
+    server.etag = '"v3"'
+    server.requests.clear()
+    assert manager.download(url, file_path) == len(CONTENT)
+    assert len(get_requests(server)) == 1
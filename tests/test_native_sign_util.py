@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from xhs_utils import native_sign_util
+from xhs_utils.native_sign_util import get_request_headers_params, trace_id
+
+"""
+    差分测试：固定随机数和时间戳，对比python实现与 static/xhs_xs_xsc_56.js 的输出，需要本地安装node
+"""
+
+STATIC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../static'))
+
+# 替换js中的 crypto.randomBytes 和 Date，使js与python使用相同的随机数和时间戳
+DIFF_TEST_JS = r"""
+const crypto = require("crypto");
+const RealDate = Date;
+let rands = [], ts = 0, i = 0;
+crypto.randomBytes = function (n) {
+  const buf = Buffer.alloc(4);
+  buf.writeUInt32LE(rands[i++ % rands.length] >>> 0, 0);
+  return buf;
+};
+global.Date = class extends RealDate {
+  constructor(...args) { args.length ? super(...args) : super(ts); }
+  static now() { return ts; }
+};
+const xs = require("./xhs_xs_xsc_56.js");
+const cases = JSON.parse(require("fs").readFileSync(0, "utf-8"));
+const out = cases.map((c) => {
+  rands = c.rands; ts = c.timestamp; i = 0;
+  return xs.get_request_headers_params(c.api, c.data, c.a1, c.method);
+});
+process.stdout.write(JSON.stringify(out));
+"""
+
+# xray 的 traceId 只使用 Math.random: 加载时取一次作为初始序号，之后每个id取两个32位随机数（先低位后高位）
+XRAY_TEST_JS = r"""
+const c = JSON.parse(require("fs").readFileSync(0, "utf-8"));
+console.log = function () {};
+let rands = [];
+Math.random = function () { return rands.length ? rands.shift() / 4294967296 : c.seq / 8388608; };
+const xray = require("./xhs_xray.js");
+rands = c.rands.slice();
+process.stdout.write(JSON.stringify(c.timestamps.map((ts) => xray.traceId(ts))));
+"""
+
+A1 = '19a5e2b3c7fxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx50000123456'
+CASES = [
+    {
+        'api': '/api/sns/web/v1/homefeed/category', 'data': '', 'method': 'GET',
+        'a1': A1, 'timestamp': 1857747414333, 'rands': [2805054262, 2247468241, 1293391134, 3297074869],
+    },
+    {
+        'api': '/api/sns/web/v1/user/otherinfo?target_user_id=67a332a2000000000d008358', 'data': '', 'method': 'GET',
+        'a1': A1[:54], 'timestamp': 1652531470925, 'rands': [1609270712, 2655218141, 290758416, 1448938859],
+    },
+    {
+        'api': '/api/sns/web/v1/feed',
+        'data': {'source_note_id': '67d7c713000000000900e391', 'image_formats': ['jpg', 'webp', 'avif'], 'extra': {'need_body_topic': '1'},
+                 'xsec_source': 'pc_user', 'xsec_token': 'AB1ACxbo5cevHxV_bWibTmK8R1DDz0NnAW1PbFZLABXtE='},
+        'method': 'POST', 'a1': A1[:36], 'timestamp': 1609479924084, 'rands': [3260080042, 2459840080, 905852467, 233773435],
+    },
+    {
+        'api': '/api/sns/web/v1/search/notes',
+        'data': {'keyword': '榴莲', 'page': 1, 'page_size': 20, 'ext_flags': [], 'geo': '', 'need_filter_image': False},
+        'method': 'POST', 'a1': A1, 'timestamp': 1675406678463, 'rands': [1652065429, 2920185740, 130333116, 3985340767],
+    },
+    {
+        'api': '/api/sns/web/v1/search/recommend', 'data': {'keyword': 'a=b', 'formats': ['jpg', None, 1], 'empty': None}, 'method': 'GET',
+        'a1': A1[:29], 'timestamp': 1699843682693, 'rands': [403698931, 2641029242, 841699620, 2399441492],
+    },
+    {
+        'api': '/api/sns/web/v2/comment/page?note_id=1&cursor=&top_comment_id=', 'data': '', 'method': 'post',
+        'a1': A1[:33], 'timestamp': 1700691768847, 'rands': [3064723293, 1653551904, 539755421, 3829200921],
+    },
+]
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='差分测试需要安装node')
+
+
+@pytest.fixture(scope='module')
+def js_results():
+    res = subprocess.run(['node', '-e', DIFF_TEST_JS], input=json.dumps(CASES), cwd=STATIC_PATH,
+                         capture_output=True, encoding='utf-8', check=True, timeout=60)
+    return json.loads(res.stdout)
+
+
+@pytest.mark.parametrize('index', range(len(CASES)), ids=[case['api'].split('?')[0] for case in CASES])
+def test_same_as_js(js_results, index):
+    case = CASES[index]
+    rands = iter(case['rands'])
+    py_ret = get_request_headers_params(case['api'], case['data'], case['a1'], case['method'], case['timestamp'], lambda: next(rands))
+    assert py_ret == js_results[index]
+
+
+# 固定初始序号、时间戳和随机数，最后一组覆盖序号到达 2^23-1 后归零
+TRACE_ID_CASES = [
+    {'seq': 0, 'timestamps': [1700000000000, 1700000000000, 1700000000001],
+     'rands': [2805054262, 2247468241, 1293391134, 3297074869, 1609270712, 2655218141]},
+    {'seq': 4660532, 'timestamps': [1857747414333, 1652531470925],
+     'rands': [0, 4294967295, 3260080042, 2459840080]},
+    {'seq': 2 ** 23 - 1, 'timestamps': [1609479924084, 1609479924085, 1609479924086],
+     'rands': [905852467, 233773435, 1652065429, 2920185740, 130333116, 3985340767]},
+]
+
+
+@pytest.mark.parametrize('case', TRACE_ID_CASES, ids=[f"seq={case['seq']}" for case in TRACE_ID_CASES])
+def test_trace_id_same_as_js(case, monkeypatch):
+    res = subprocess.run(['node', '-e', XRAY_TEST_JS], input=json.dumps(case), cwd=STATIC_PATH,
+                         capture_output=True, encoding='utf-8', check=True, timeout=60)
+    js_ids = json.loads(res.stdout)
+    monkeypatch.setattr(native_sign_util, '_trace_id_seq', case['seq'])
+    rands = iter(case['rands'])
+    py_ids = [trace_id(timestamp, lambda: next(rands)) for timestamp in case['timestamps']]
+    assert py_ids == js_ids
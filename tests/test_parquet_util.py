@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from xhs_utils.parquet_util import Parquet_Sink, parse_count
+
+
+def list_files(root: str):
+    return [os.path.join(path, name) for path, _, names in os.walk(root) for name in names]
+
+
+def row_groups(root: str, table: str):
+    return sum(pq.ParquetFile(path).num_row_groups for path in list_files(os.path.join(root, table)))
+
+
+def test_parse_count():
+    assert parse_count('1.2万') == 12000
+    assert parse_count('10+') == 10
+    assert parse_count('1千+') == 1000
+    assert parse_count(7) == 7
+    assert parse_count('abc') is None
+
+
+def test_flush_keeps_row_groups_full(tmp_path):
+    root = str(tmp_path)
+    sink = Parquet_Sink(root)
+    try:
+        # 与 spider_user_complete_data 一样每篇笔记保存后调用一次 flush
+        for index in range(50):
+            sink.save_notes([{'note_id': f'n{index}', 'user_id': 'u1', 'liked_count': '10+'}])
+            sink.save_comments([{'note_id': f'n{index}', 'comment_id': f'c{index}'}], note_user_id='u1')
+            sink.flush()
+        # 关闭前只有写入中的隐藏文件，读取目录时会被忽略
+        assert all(os.path.basename(path).startswith('.') for path in list_files(root))
+    finally:
+        sink.close()
+    assert row_groups(root, 'notes') == 1
+    assert row_groups(root, 'comments') == 1
+    assert pq.read_table(os.path.join(root, 'notes')).num_rows == 50
+
+
+def test_comments_partitioned_by_note_author(tmp_path):
+    root = str(tmp_path)
+    with Parquet_Sink(root) as sink:
+        sink.save_notes([{'note_id': 'n1', 'user_id': 'u1'}])
+        sink.save_comments([{'note_id': 'n1', 'comment_id': 'c1'}])
+        # 断点续爬时笔记是上次运行保存的，由调用方传入作者
+        sink.save_comments([{'note_id': 'n2', 'comment_id': 'c2'}], note_user_id='u2')
+    assert sorted(os.listdir(os.path.join(root, 'comments'))) == ['user=u1', 'user=u2']
+
+
+def test_buffered_rows_bounded(tmp_path):
+    root = str(tmp_path)
+    with Parquet_Sink(root, row_group_size=1000, max_buffered_rows=30) as sink:
+        for user in range(10):
+            sink.save_notes([{'note_id': f'n{user}_{index}', 'user_id': f'u{user}'} for index in range(5)])
+            assert sink.buffered_rows <= 30
+    assert pq.read_table(os.path.join(root, 'notes')).num_rows == 50
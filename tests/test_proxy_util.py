@@ -0,0 +1,115 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from xhs_utils.proxy_util import Proxy_Pool, send_with_proxies
+
+
+class Mock_Proxy_Handler(BaseHTTPRequestHandler):
+    """
+        模拟HTTP代理: 按代理格式接收请求（GET http://host/path），返回 server.status
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.hits += 1
+        body = b'ok'
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def mock_proxies():
+    servers = []
+    for _ in range(3):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Mock_Proxy_Handler)
+        server.status = 200
+        server.hits = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def proxy_url(server):
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def get(proxy_pool):
+    return send_with_proxies(lambda proxies: requests.get('http://target.test/', proxies=proxies, timeout=5), proxy_pool)
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_cold_requests_spread_across_proxies():
+    proxy_pool = Proxy_Pool(['http://127.0.0.1:1', 'http://127.0.0.1:2', 'http://127.0.0.1:3'])
+    # 没有样本时不应全部选择第一个代理
+    acquired = [proxy_pool.acquire() for _ in range(3)]
+    assert len({proxy.url for proxy in acquired}) == 3
+    for proxy in acquired:
+        proxy_pool.release(proxy, True, 0.1)
+    # 顺序请求时也轮流尝试还没有样本的代理
+    proxy_pool = Proxy_Pool(['http://127.0.0.1:1', 'http://127.0.0.1:2'])
+    urls = []
+    for _ in range(2):
+        proxy = proxy_pool.acquire()
+        urls.append(proxy.url)
+        proxy_pool.release(proxy, True, 0.1)
+    assert len(set(urls)) == 2
+
+
+def test_route_to_faster_proxy():
+    proxy_pool = Proxy_Pool(['http://127.0.0.1:1', 'http://127.0.0.1:2'])
+    slow, fast = proxy_pool.proxy_list
+    for _ in range(5):
+        slow.record(True, 2.0)
+        fast.record(True, 0.2)
+    assert [proxy_pool.acquire() for _ in range(3)].count(fast) == 3
+
+
+def test_quarantine_backoff_and_probe(mock_proxies):
+    good, bad, _ = mock_proxies
+    bad.status = 502
+    proxy_pool = Proxy_Pool([proxy_url(good), proxy_url(bad)], max_failures=2, quarantine=0.2, max_quarantine=5,
+                            probe_url='http://target.test/probe', probe_timeout=2)
+    bad_proxy = proxy_pool.proxy_list[1]
+    try:
+        # 两个代理的分数接近，出错的代理不一定每次都被选中
+        for _ in range(50):
+            get(proxy_pool)
+            if bad_proxy.quarantined():
+                break
+        # 连续失败后隔离，之后的请求都走正常的代理
+        assert bad_proxy.quarantined()
+        assert bad.hits == 2
+        hits = good.hits
+        for _ in range(3):
+            assert get(proxy_pool).status_code == 200
+        assert good.hits == hits + 3
+
+        # 隔离期满后探测仍然失败，隔离时间翻倍
+        assert wait_until(lambda: bad_proxy.quarantine_times >= 2)
+        assert bad.hits >= 3
+        assert bad_proxy.quarantined()
+
+        # 代理恢复后下一次探测成功，重新参与选择
+        bad.status = 200
+        assert wait_until(lambda: not bad_proxy.quarantined())
+        assert bad_proxy.consecutive_failures == 0
+    finally:
+        proxy_pool.close()
@@ -0,0 +1,200 @@
+import gzip
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+"""
+    原始响应归档，保存接口返回的完整json，之后需要新字段时可以在本地重新处理，不需要重新爬取
+    数据按顺序追加到分片文件 raw-00001.jsonl.gz, raw-00002.jsonl.gz ...，每条记录是一个独立的gzip块
+    多个gzip块拼接后仍是合法的gzip文件，可以直接用 zcat 查看；单条记录可以根据偏移量单独解压
+    index.db 记录 (类型, 笔记id) -> (分片, 偏移量, 长度)，同一篇笔记重复归档时索引指向最新的一条
+    读取时用mmap映射分片文件，随机读取任意一条记录不需要从头解压
+    记录类型:
+        note: 笔记详情接口 /api/sns/web/v1/feed 返回的json
+        comment_pages: 一篇笔记的一级评论 /comment/page 和二级评论 /comment/sub/page 每页返回的json列表，
+                       格式见 apis.xhs_pc_apis.comment_page_recorder，archive_comments 可以重建 get_note_all_comment 的结果
+    使用完必须调用 close()（建议放在finally中），否则mmap和索引数据库不会关闭
+    用法:
+        archive = Raw_Archive('datas/raw_archive')
+        try:
+            archive.append(note_id, note_info_raw, url=note_url)
+            record = archive.get(note_id)
+            for record in archive.iter_records():
+                note_info = handle_note_info(archive_note_item(record))
+            for record in archive.iter_records('comment_pages'):
+                comments = archive_comments(record)
+        finally:
+            archive.close()
+"""
+
+
+def archive_note_item(record: dict):
+    """
+        从笔记详情的归档记录中取出 handle_note_info 需要的数据
+    """
+    item = record['response']['data']['items'][0]
+    item['url'] = record.get('url')
+    return item
+
+
+def archive_comments(record: dict):
+    """
+        从评论的归档记录（comment_pages）中重建 get_note_all_comment 返回的评论列表:
+        一级评论按接口返回的顺序，每条一级评论后续页的二级评论按顺序追加到它的 sub_comments
+    """
+    comments = []
+    root_comments = {}
+    for page in record['response']:
+        if page['root_comment_id'] is None:
+            for comment in page['response']['data'].get('comments') or []:
+                comments.append(comment)
+                root_comments[comment['id']] = comment
+    for page in record['response']:
+        root_comment = root_comments.get(page['root_comment_id'])
+        if root_comment is not None:
+            sub_comments = page['response']['data'].get('comments') or []
+            root_comment['sub_comments'] = (root_comment.get('sub_comments') or []) + sub_comments
+    return comments
+
+
+class Raw_Archive():
+    """
+        :param root: 归档目录
+        :param shard_size: 单个分片文件的大小上限（字节），超过后写入新的分片
+        :param compress_level: gzip压缩级别
+    """
+    def __init__(self, root: str, shard_size: int = 256 * 1024 * 1024, compress_level: int = 6):
+        self.root = root
+        self.shard_size = shard_size
+        self.compress_level = compress_level
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    kind TEXT NOT NULL,
+                    note_id TEXT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    fetched_at REAL,
+                    PRIMARY KEY (kind, note_id)
+                )
+            ''')
+        shards = self.list_shards()
+        self.shard = shards[-1] if shards else 1
+        self.file = None
+        self.maps = {}
+
+    def shard_path(self, shard: int):
+        return os.path.join(self.root, f'raw-{shard:05d}.jsonl.gz')
+
+    def list_shards(self):
+        shards = []
+        for file_name in os.listdir(self.root):
+            if file_name.startswith('raw-') and file_name.endswith('.jsonl.gz'):
+                shards.append(int(file_name[4:9]))
+        return sorted(shards)
+
+    def _open(self):
+        if self.file is None:
+            self.file = open(self.shard_path(self.shard), 'ab')
+        elif self.file.tell() >= self.shard_size:
+            self.file.close()
+            self.shard += 1
+            self.file = open(self.shard_path(self.shard), 'ab')
+        return self.file
+
+    def append(self, note_id: str, response, kind: str = 'note', url: str = None):
+        """
+            归档一条原始响应
+            :param note_id: 笔记id
+            :param response: 接口返回的json
+            :param kind: 记录的类型，如 note（笔记详情）、comments（评论）
+            :param url: 请求的笔记url，重新处理笔记详情时需要
+        """
+        fetched_at = time.time()
+        record = {'kind': kind, 'note_id': note_id, 'url': url, 'fetched_at': fetched_at, 'response': response}
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        data = gzip.compress(line.encode('utf-8'), compresslevel=self.compress_level, mtime=0)
+        with self.lock:
+            f = self._open()
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            with self.conn:
+                self.conn.execute('''
+                    INSERT INTO records (kind, note_id, shard, offset, length, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (kind, note_id) DO UPDATE SET shard = excluded.shard, offset = excluded.offset,
+                        length = excluded.length, fetched_at = excluded.fetched_at
+                ''', (kind, note_id, self.shard, offset, len(data), fetched_at))
+
+    def _map(self, shard: int, end: int):
+        """
+            返回分片文件的mmap，正在写入的分片变长后重新映射
+        """
+        mm = self.maps.get(shard)
+        if mm is None or len(mm) < end:
+            if mm is not None:
+                mm.close()
+            with open(self.shard_path(shard), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[shard] = mm
+        return mm
+
+    def _read(self, shard: int, offset: int, length: int):
+        with self.lock:
+            mm = self._map(shard, offset + length)
+            data = mm[offset:offset + length]
+        return json.loads(gzip.decompress(data))
+
+    def locate(self, note_id: str, kind: str = 'note'):
+        """
+            返回 (分片, 偏移量, 长度)，没有归档时返回None
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT shard, offset, length FROM records WHERE kind = ? AND note_id = ?', (kind, note_id)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def __contains__(self, note_id: str):
+        return self.locate(note_id) is not None
+
+    def get(self, note_id: str, kind: str = 'note'):
+        """
+            读取一篇笔记最新的归档记录，没有归档时返回None
+        """
+        location = self.locate(note_id, kind)
+        if location is None:
+            return None
+        return self._read(*location)
+
+    def iter_records(self, kind: str = 'note'):
+        """
+            按分片和偏移量的顺序读取每篇笔记最新的归档记录，顺序读取分片文件
+        """
+        with self.lock:
+            cursor = self.conn.execute('SELECT shard, offset, length FROM records WHERE kind = ? ORDER BY shard, offset', (kind,))
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield self._read(*row)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            for mm in self.maps.values():
+                mm.close()
+            self.maps.clear()
+            self.conn.close()
@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import threading
+import time
+
+"""
+    基于SQLite的爬取进度记录，批量爬取中断（崩溃、Ctrl-C、SIGTERM）后再次运行时跳过已完成的用户和笔记
+    users: 每个用户的状态、笔记列表、最后处理到的笔记（last_cursor）、完成时间和失败次数
+    notes: 每篇笔记的状态、处理后的笔记信息和评论、完成时间和失败次数
+    已完成笔记的数据保存在库中，续爬时不需要重新请求也能生成完整的表格
+"""
+
+RUNNING = 'running'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class Crawl_Checkpoint():
+    """
+        :param db_path: 数据库文件路径
+        :param max_failures: 失败多少次后不再重试
+    """
+    def __init__(self, db_path: str, max_failures: int = 3):
+        self.db_path = db_path
+        self.max_failures = max_failures
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    note_list TEXT,
+                    last_cursor TEXT,
+                    fetched_at REAL,
+                    fail_count INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS notes (
+                    note_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    note_info TEXT,
+                    comments TEXT,
+                    fetched_at REAL,
+                    fail_count INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS notes_user_id ON notes (user_id)')
+
+    def _execute(self, sql: str, params=()):
+        with self.lock, self.conn:
+            self.conn.execute(sql, params)
+
+    def _query_one(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def get_user(self, user_id: str):
+        """
+            返回用户的状态字典，没有记录时返回None
+        """
+        row = self._query_one('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        if row is None:
+            return None
+        user = dict(row)
+        user['note_list'] = json.loads(user['note_list']) if user['note_list'] else None
+        return user
+
+    def should_skip_user(self, user: dict):
+        """
+            已完成或失败次数过多的用户不再处理
+        """
+        return user is not None and (user['status'] == DONE or user['fail_count'] >= self.max_failures)
+
+    def start_user(self, user_id: str):
+        self._execute('''
+            INSERT INTO users (user_id, status) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET status = excluded.status
+        ''', (user_id, RUNNING))
+
+    def save_user_note_list(self, user_id: str, note_list: list):
+        """
+            保存用户的笔记列表，续爬时不需要重新翻页
+        """
+        self._execute('UPDATE users SET note_list = ? WHERE user_id = ?', (json.dumps(note_list, ensure_ascii=False), user_id))
+
+    def set_user_cursor(self, user_id: str, cursor: str):
+        self._execute('UPDATE users SET last_cursor = ? WHERE user_id = ?', (cursor, user_id))
+
+    def finish_user(self, user_id: str):
+        self._execute('UPDATE users SET status = ?, fetched_at = ?, error = NULL WHERE user_id = ?', (DONE, time.time(), user_id))
+
+    def fail_user(self, user_id: str, error: str):
+        self._execute('''
+            INSERT INTO users (user_id, status, fail_count, error) VALUES (?, ?, 1, ?)
+            ON CONFLICT (user_id) DO UPDATE SET status = excluded.status, fail_count = fail_count + 1, error = excluded.error
+        ''', (user_id, FAILED, str(error)))
+
+    def get_note(self, note_id: str):
+        """
+            返回笔记的状态字典，没有记录时返回None
+        """
+        row = self._query_one('SELECT * FROM notes WHERE note_id = ?', (note_id,))
+        if row is None:
+            return None
+        note = dict(row)
+        note['note_info'] = json.loads(note['note_info']) if note['note_info'] else None
+        note['comments'] = json.loads(note['comments']) if note['comments'] else []
+        return note
+
+    def should_skip_note(self, note: dict):
+        """
+            已完成、已跳过或失败次数过多的笔记不再处理
+        """
+        return note is not None and (note['status'] in (DONE, SKIPPED) or note['fail_count'] >= self.max_failures)
+
+    def finish_note(self, note_id: str, user_id: str, note_info: dict, comments: list):
+        self._execute('''
+            INSERT INTO notes (note_id, user_id, status, note_info, comments, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (note_id) DO UPDATE SET status = excluded.status, note_info = excluded.note_info,
+                comments = excluded.comments, fetched_at = excluded.fetched_at, error = NULL
+        ''', (note_id, user_id, DONE, json.dumps(note_info, ensure_ascii=False), json.dumps(comments, ensure_ascii=False), time.time()))
+
+    def skip_note(self, note_id: str, user_id: str, reason: str = ''):
+        self._execute('''
+            INSERT INTO notes (note_id, user_id, status, fetched_at, error) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (note_id) DO UPDATE SET status = excluded.status, fetched_at = excluded.fetched_at, error = excluded.error
+        ''', (note_id, user_id, SKIPPED, time.time(), reason))
+
+    def fail_note(self, note_id: str, user_id: str, error: str):
+        self._execute('''
+            INSERT INTO notes (note_id, user_id, status, fail_count, error) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (note_id) DO UPDATE SET status = excluded.status, fail_count = fail_count + 1, error = excluded.error
+        ''', (note_id, user_id, FAILED, str(error)))
+
+    def count_retryable_notes(self, user_id: str):
+        """
+            用户下失败但还没达到重试上限的笔记数，大于0时用户不能标记为完成，下次运行时重试这些笔记
+        """
+        row = self._query_one('SELECT COUNT(*) FROM notes WHERE user_id = ? AND status = ? AND fail_count < ?', (user_id, FAILED, self.max_failures))
+        return row[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,12 +1,28 @@
 import os
 from loguru import logger
 from dotenv import load_dotenv
+from xhs_utils.cookie_util import Cookie_Pool
 
 def load_env():
     load_dotenv()
     cookies_str = os.getenv('COOKIES')
     return cookies_str
 
+def load_cookie_pool(**kwargs):
+    """
+        加载多账号cookies池
+        优先读取 COOKIES_FILE 指定的文件（每行一个账号），否则把 COOKIES 按行拆分为多个账号
+        :param kwargs: 传给 Cookie_Pool 的参数
+    """
+    load_dotenv()
+    cookies_file = os.getenv('COOKIES_FILE')
+    if cookies_file:
+        cookie_pool = Cookie_Pool.from_file(cookies_file, **kwargs)
+    else:
+        cookie_pool = Cookie_Pool(os.getenv('COOKIES', '').splitlines(), **kwargs)
+    logger.info(f'账号池加载 {len(cookie_pool)} 个账号')
+    return cookie_pool
+
 def init():
     media_base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/media_datas'))
     excel_base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/excel_datas'))
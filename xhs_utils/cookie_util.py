@@ -1,6 +1,204 @@
-def trans_cookies(cookies_str):
+import asyncio
+import functools
+import threading
+import time
+from loguru import logger
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_cookies(cookies_str):
     if '; ' in cookies_str:
-        ck = {i.split('=')[0]: '='.join(i.split('=')[1:]) for i in cookies_str.split('; ')}
-    else:
-        ck = {i.split('=')[0]: '='.join(i.split('=')[1:]) for i in cookies_str.split(';')}
-    return ck
+        return tuple((i.split('=')[0], '='.join(i.split('=')[1:])) for i in cookies_str.split('; '))
+    return tuple((i.split('=')[0], '='.join(i.split('=')[1:])) for i in cookies_str.split(';'))
+
+def trans_cookies(cookies_str):
+    # 同一个cookies字符串只解析一次，每次返回新的字典，调用方可以放心修改
+    return dict(_parse_cookies(cookies_str))
+
+
+class Account():
+    """
+        账号池中的一个账号，cookies在创建时解析一次
+        成功率和延迟使用指数滑动平均，越新的请求权重越大
+    """
+    def __init__(self, cookies_str: str, max_concurrency: int = 2, alpha: float = 0.2):
+        self.cookies_str = cookies_str.strip()
+        self.cookies = trans_cookies(self.cookies_str)
+        self.a1 = self.cookies.get('a1', '')
+        self.max_concurrency = max_concurrency
+        self.alpha = alpha
+        self.success_rate = 1.0
+        self.latency = 1.0
+        self.in_flight = 0
+        self.total = 0
+        self.fail_count = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0
+        self.last_used = 0
+        self.disabled = False
+
+    def score(self):
+        return self.success_rate / (self.latency + 0.1)
+
+    def available(self, now: float):
+        return not self.disabled and self.cooldown_until <= now and self.in_flight < self.max_concurrency
+
+    def record(self, success: bool, latency: float):
+        self.total += 1
+        self.success_rate += self.alpha * ((1.0 if success else 0.0) - self.success_rate)
+        self.latency += self.alpha * (latency - self.latency)
+        if success:
+            self.consecutive_failures = 0
+        else:
+            self.fail_count += 1
+            self.consecutive_failures += 1
+
+    def stats(self):
+        return {
+            'a1': self.a1,
+            'success_rate': round(self.success_rate, 3),
+            'latency': round(self.latency, 3),
+            'in_flight': self.in_flight,
+            'total': self.total,
+            'fail_count': self.fail_count,
+            'cooling': self.cooldown_until > time.monotonic(),
+            'disabled': self.disabled,
+        }
+
+
+class Cookie_Pool():
+    """
+        多账号cookies池，每次调用选择有空闲并发、未被限流且健康分最高的账号
+        :param cookies_list: cookies字符串列表，每个元素是一个账号
+        :param max_concurrency: 每个账号同时进行的请求数，总吞吐随账号数增加
+        :param max_failures: 连续失败多少次后暂时移出轮换
+        :param cooldown: 第一次移出轮换的冷却时间（秒），之后每次翻倍
+        :param max_cooldown: 冷却时间上限（秒）
+        用法:
+            cookie_pool = Cookie_Pool([cookies_str1, cookies_str2])
+            success, msg, note_info = cookie_pool.call(xhs_apis.get_note_info, note_url, proxies=proxies)
+    """
+    # 登录失效的返回码，出现后该账号不再使用
+    INVALID_CODES = (-100, -101)
+
+    def __init__(self, cookies_list: list, max_concurrency: int = 2, max_failures: int = 3, cooldown: float = 60, max_cooldown: float = 1800):
+        self.accounts = [Account(cookies_str, max_concurrency) for cookies_str in cookies_list if cookies_str and cookies_str.strip()]
+        if not self.accounts:
+            raise ValueError('cookies_list 不能为空')
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.condition = threading.Condition()
+
+    @classmethod
+    def from_file(cls, file_path: str, **kwargs):
+        """
+            从文件读取cookies，每行一个账号，#开头的行会被忽略
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            cookies_list = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        return cls(cookies_list, **kwargs)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _select(self, now: float):
+        candidates = [account for account in self.accounts if account.available(now)]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda account: (account.score(), -account.in_flight, -account.last_used))
+
+    def _next_ready_time(self, now: float):
+        cooldowns = [account.cooldown_until for account in self.accounts if not account.disabled and account.cooldown_until > now]
+        return min(cooldowns) - now if cooldowns else None
+
+    def try_acquire(self):
+        """
+            立即取出一个可用账号，没有时返回None
+        """
+        with self.condition:
+            now = time.monotonic()
+            account = self._select(now)
+            if account is not None:
+                account.in_flight += 1
+                account.last_used = now
+            return account
+
+    def acquire(self, timeout: float = None):
+        """
+            取出一个可用账号，所有账号都忙或被限流时阻塞等待
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if all(account.disabled for account in self.accounts):
+                    raise RuntimeError('账号池中所有账号都已失效')
+                account = self._select(now)
+                if account is not None:
+                    account.in_flight += 1
+                    account.last_used = now
+                    return account
+                wait = self._next_ready_time(now)
+                if deadline is not None:
+                    remain = deadline - now
+                    if remain <= 0:
+                        raise TimeoutError('等待可用账号超时')
+                    wait = remain if wait is None else min(wait, remain)
+                self.condition.wait(wait)
+
+    def release(self, account: Account, success: bool, latency: float, res=None):
+        """
+            归还账号并记录本次请求的结果
+        """
+        with self.condition:
+            account.in_flight -= 1
+            account.record(success, latency)
+            if isinstance(res, dict) and res.get('code') in self.INVALID_CODES:
+                account.disabled = True
+                logger.warning(f'账号 {account.a1} 登录已失效，移出账号池: {res.get("msg")}')
+            elif account.consecutive_failures >= self.max_failures:
+                times = account.consecutive_failures - self.max_failures
+                cooldown = min(self.cooldown * 2 ** times, self.max_cooldown)
+                account.cooldown_until = time.monotonic() + cooldown
+                logger.warning(f'账号 {account.a1} 连续失败 {account.consecutive_failures} 次，暂停使用 {cooldown:g} 秒')
+            self.condition.notify_all()
+
+    def call(self, func, *args, **kwargs):
+        """
+            选择一个账号作为 cookies_str 参数调用 XHS_Apis 的方法，并根据返回的 success 更新账号状态
+        """
+        account = self.acquire()
+        start = time.monotonic()
+        success, res = False, None
+        try:
+            result = func(*args, cookies_str=account.cookies_str, **kwargs)
+            success, res = result[0], result[-1]
+            return result
+        finally:
+            self.release(account, success, time.monotonic() - start, res)
+
+    async def call_async(self, func, *args, **kwargs):
+        """
+            call 的异步版本，用于 XHS_Async_Apis 的方法
+        """
+        account = self.try_acquire()
+        while account is None:
+            with self.condition:
+                if all(account.disabled for account in self.accounts):
+                    raise RuntimeError('账号池中所有账号都已失效')
+                wait = self._next_ready_time(time.monotonic())
+            await asyncio.sleep(min(wait, 1) if wait else 0.05)
+            account = self.try_acquire()
+        start = time.monotonic()
+        success, res = False, None
+        try:
+            result = await func(*args, cookies_str=account.cookies_str, **kwargs)
+            success, res = result[0], result[-1]
+            return result
+        finally:
+            self.release(account, success, time.monotonic() - start, res)
+
+    def stats(self):
+        with self.condition:
+            return [account.stats() for account in self.accounts]
@@ -3,17 +3,19 @@ import os
 import re
 import time
 import openpyxl
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
-from retry import retry
+from xhs_utils.download_util import Download_Manager
+from xhs_utils.media_store_util import Media_Store
 
 
 def norm_str(str):
     new_str = re.sub(r"|[\\/:*?\"<>| ]+", "", str).replace('\n', '').replace('\r', '')
     return new_str
 
+ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
 def norm_text(text):
-    ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
     text = ILLEGAL_CHARACTERS_RE.sub(r'', text)
     return text
 
@@ -175,35 +177,128 @@ def handle_comment_info(data):
         'ip_location': ip_location,
         'pictures': pictures,
     }
-def save_to_xlsx(datas, file_path, type='note'):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    if type == 'note':
-        headers = ['笔记id', '笔记url', '笔记类型', '用户id', '用户主页url', '昵称', '头像url', '标题', '描述', '点赞数量', '收藏数量', '评论数量', '分享数量', '视频封面url', '视频地址url', '图片地址url列表', '标签', '上传时间', 'ip归属地']
-    elif type == 'user':
-        headers = ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签']
-    else:
-        headers = ['笔记id', '笔记url', '评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表']
-    ws.append(headers)
-    for data in datas:
-        data = {k: norm_text(str(v)) for k, v in data.items()}
-        ws.append(list(data.values()))
-    wb.save(file_path)
-    logger.info(f'数据保存至 {file_path}')
-
-def download_media(path, name, url, type):
+XLSX_HEADERS = {
+    'note': ['笔记id', '笔记url', '笔记类型', '用户id', '用户主页url', '昵称', '头像url', '标题', '描述', '点赞数量', '收藏数量', '评论数量', '分享数量', '视频封面url', '视频地址url', '图片地址url列表', '标签', '上传时间', 'ip归属地'],
+    'user': ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签'],
+    'comment': ['笔记id', '笔记url', '评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表'],
+}
+# Excel单个工作表最多 1048576 行，去掉表头
+XLSX_MAX_ROWS = 1048575
+
+
+class Xlsx_Writer():
+    """
+        流式写入xlsx，使用openpyxl的write_only模式，写入的行不会保留在内存中
+        行数达到 max_rows 时自动换到新文件: 数据.xlsx, 数据_2.xlsx, 数据_3.xlsx ...
+        :param file_path: 第一个文件的路径
+        :param type: note / user / comment，决定表头
+        :param max_rows: 每个文件最多写入的数据行数
+        用法:
+            with Xlsx_Writer(file_path, type='comment') as writer:
+                for comment in comments:
+                    writer.write(comment)
+    """
+    def __init__(self, file_path: str, type: str = 'note', max_rows: int = XLSX_MAX_ROWS):
+        self.file_path = file_path
+        self.headers = XLSX_HEADERS.get(type, XLSX_HEADERS['comment'])
+        self.max_rows = max_rows
+        self.file_paths = []
+        self.wb = None
+        self.ws = None
+        self.rows = 0
+        self.total = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _shard_path(self, index: int):
+        if index == 1:
+            return self.file_path
+        root, ext = os.path.splitext(self.file_path)
+        return f'{root}_{index}{ext}'
+
+    def _open(self):
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+        self.ws.append(self.headers)
+        self.rows = 0
+        self.file_paths.append(self._shard_path(len(self.file_paths) + 1))
+
+    def _save(self):
+        self.wb.save(self.file_paths[-1])
+        logger.info(f'数据保存至 {self.file_paths[-1]}')
+        self.wb = None
+        self.ws = None
+
+    def write(self, data: dict):
+        if self.ws is None:
+            self._open()
+        elif self.rows >= self.max_rows:
+            self._save()
+            self._open()
+        self.ws.append([norm_text(v if isinstance(v, str) else str(v)) for v in data.values()])
+        self.rows += 1
+        self.total += 1
+
+    def write_rows(self, datas):
+        for data in datas:
+            self.write(data)
+
+    def close(self):
+        """
+            保存当前文件，没有写入任何数据时也会生成只有表头的文件
+        """
+        if self.wb is None and not self.file_paths:
+            self._open()
+        if self.wb is not None:
+            self._save()
+        return self.file_paths
+
+
+def save_to_xlsx(datas, file_path, type='note', max_rows: int = XLSX_MAX_ROWS):
+    """
+        保存为xlsx，datas 可以是列表或生成器，超过 max_rows 行时拆分为多个文件
+        返回保存的文件路径列表
+    """
+    with Xlsx_Writer(file_path, type, max_rows) as writer:
+        writer.write_rows(datas)
+    return writer.file_paths
+
+# 媒体下载共用的下载器，限制总并发和每个host的并发（图片和视频分别来自少数几个CDN host），可替换为自定义参数的 Download_Manager
+# 下载的媒体按id去重保存在 datas/media_store 中，笔记文件夹中是指向它的硬链接
+media_store_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/media_store'))
+media_download_manager = Download_Manager(max_workers=32, per_host=8, media_store=Media_Store(media_store_path))
+
+def download_media(path, name, url, type, proxies=None):
+    # proxies 可以是代理字典，也可以是 Proxy_Pool
     if type == 'image':
-        content = requests.get(url).content
-        with open(path + '/' + name + '.jpg', mode="wb") as f:
-            f.write(content)
+        media_download_manager.download(url, path + '/' + name + '.jpg', proxies)
     elif type == 'video':
-        res = requests.get(url, stream=True)
-        size = 0
-        chunk_size = 1024 * 1024
-        with open(path + '/' + name + '.mp4', mode="wb") as f:
-            for data in res.iter_content(chunk_size=chunk_size):
-                f.write(data)
-                size += len(data)
+        # 视频按 Range 分段并行下载，中断后可以续传
+        media_download_manager.download(url, path + '/' + name + '.mp4', proxies, segmented=True)
+
+def set_download_bandwidth(bytes_per_second=None):
+    """
+        限制所有媒体下载合计的带宽（字节/秒），避免下载视频时占满与api请求共用的上行带宽，None为不限制
+    """
+    media_download_manager.set_bandwidth_limit(bytes_per_second)
+
+def download_many_media(tasks, proxies=None):
+    """
+        并行下载多个媒体文件
+        :param tasks: [(path, name, url, type), ...]
+        有文件下载失败时抛出异常
+    """
+    ext = {'image': '.jpg', 'video': '.mp4'}
+    download_tasks = [(url, path + '/' + name + ext[type]) for path, name, url, type in tasks]
+    results, progress = media_download_manager.download_many(download_tasks, proxies)
+    logger.info(f'媒体下载 {progress}')
+    errors = [msg for success, msg in results if not success]
+    if errors:
+        raise Exception(f'{len(errors)} 个文件下载失败: {errors[0]}')
 
 def save_user_detail(user, path):
     with open(f'{path}/detail.txt', mode="w", encoding="utf-8") as f:
@@ -246,8 +341,10 @@ def save_note_detail(note, path):
 
 
 
-@retry(tries=3, delay=1)
-def download_note(note_info, path, save_choice):
+def get_note_save_path(note_info, path):
+    """
+        笔记的保存文件夹: {path}/{昵称}_{用户id}/{标题}_{笔记id}
+    """
     note_id = note_info['note_id']
     user_id = note_info['user_id']
     title = note_info['title']
@@ -256,7 +353,45 @@ def download_note(note_info, path, save_choice):
     nickname = norm_str(nickname)[:20]
     if title.strip() == '':
         title = f'无标题'
-    save_path = f'{path}/{nickname}_{user_id}/{title}_{note_id}'
+    return f'{path}/{nickname}_{user_id}/{title}_{note_id}'
+
+
+def save_note_comments(comments, note_folders: dict, max_workers: int = 8):
+    """
+        按笔记分组评论，并行保存到各笔记文件夹的 评论.xlsx
+        :param comments: 评论列表，每条评论有 note_id
+        :param note_folders: 笔记id -> 笔记文件夹
+        返回 (已保存的笔记id列表, 有评论但没有文件夹的笔记id列表)
+    """
+    comments_by_note = {}
+    for comment in comments:
+        comments_by_note.setdefault(comment['note_id'], []).append(comment)
+    missing = [note_id for note_id in comments_by_note if note_id not in note_folders]
+
+    def save(note_id):
+        note_comments = comments_by_note[note_id]
+        save_to_xlsx(note_comments, os.path.join(note_folders[note_id], '评论.xlsx'), type='comment')
+        return len(note_comments)
+
+    saved = []
+    note_ids = [note_id for note_id in comments_by_note if note_id in note_folders]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='comment-xlsx') as executor:
+        futures = {note_id: executor.submit(save, note_id) for note_id in note_ids}
+        for note_id, future in futures.items():
+            try:
+                logger.info(f'笔记 {note_id} 评论已保存 ({future.result()}条)')
+                saved.append(note_id)
+            except Exception as e:
+                logger.error(f'笔记 {note_id} 评论保存失败: {e}')
+    return saved, missing
+
+
+def download_note(note_info, path, save_choice, download_video=False):
+    """
+        保存笔记信息并下载媒体
+        :param download_video: 视频笔记是否下载视频文件，默认只保存封面，可配合 set_download_bandwidth 限制带宽
+    """
+    save_path = get_note_save_path(note_info, path)
     check_and_create_path(save_path)
     with open(f'{save_path}/info.json', mode='w', encoding='utf-8') as f:
         f.write(json.dumps(note_info) + '\n')
@@ -264,12 +399,13 @@ def download_note(note_info, path, save_choice):
     save_note_detail(note_info, save_path)
     # 图集：仍然按配置下载图片
     if note_type == '图集' and save_choice in ['media', 'media-image', 'all']:
-        for img_index, img_url in enumerate(note_info['image_list']):
-            download_media(save_path, f'image_{img_index}', img_url, 'image')
-    # 视频：仅保存封面图片，不再下载视频文件，避免占用大量带宽和存储
+        download_many_media([(save_path, f'image_{img_index}', img_url, 'image') for img_index, img_url in enumerate(note_info['image_list'])])
+    # 视频：默认仅保存封面图片，不下载视频文件，避免占用大量带宽和存储
     elif note_type == '视频' and save_choice in ['media', 'media-video', 'all']:
         if note_info.get('video_cover'):
             download_media(save_path, 'cover', note_info['video_cover'], 'image')
+        if download_video and note_info.get('video_addr'):
+            download_media(save_path, 'video', note_info['video_addr'], 'video')
     return save_path
 
 
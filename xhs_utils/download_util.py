@@ -0,0 +1,382 @@
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from loguru import logger
+from xhs_utils.media_store_util import Media_Store, get_media_id
+from xhs_utils.proxy_util import send_with_proxies
+from xhs_utils.session_util import Session_Pool
+
+# 每个目录下记录已下载文件大小和ETag的文件，用于跳过已下载的文件和断点续传
+META_FILE_NAME = '.download.json'
+# 这些状态码重试也不会成功
+NO_RETRY_STATUS_CODES = (400, 401, 403, 404, 410)
+
+
+def is_retryable(e: Exception):
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code not in NO_RETRY_STATUS_CODES
+    return True
+
+
+class Download_Progress():
+    """
+        一批下载任务的进度，多个线程同时更新
+    """
+    def __init__(self, total: int, callback=None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start_time = time.monotonic()
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def add_bytes(self, size: int):
+        with self.lock:
+            self.bytes += size
+
+    def finish(self, success: bool):
+        with self.lock:
+            self.done += 1
+            if not success:
+                self.failed += 1
+        if self.callback is not None:
+            self.callback(self)
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def speed(self):
+        """
+            平均下载速度（字节/秒）
+        """
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed > 0 else 0
+
+    def __str__(self):
+        return f'{self.done}/{self.total} 失败 {self.failed}，{self.bytes / 1024 / 1024:.2f}MB，{self.speed() / 1024 / 1024:.2f}MB/s，耗时 {self.elapsed():.2f}s'
+
+
+class Bandwidth_Limiter():
+    """
+        全局带宽限制，所有下载线程共用，最多允许一秒的突发
+        :param bytes_per_second: 每秒最多下载的字节数
+    """
+    def __init__(self, bytes_per_second: int):
+        self.rate = bytes_per_second
+        self.tokens = bytes_per_second
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, size: int):
+        """
+            记录下载了 size 字节，超出预算时阻塞到预算恢复
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            self.tokens -= size
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class Download_Manager():
+    """
+        并行的流式下载器
+        所有下载共用一个有界线程池，并限制每个host同时下载的数量
+        文件先以固定大小的块写入同目录下的 .part 临时文件，下载完成后原子重命名，不会留下半个文件
+        每个文件单独重试，重试间隔指数增长并带随机抖动；重试时通过 Range 从 .part 已有的位置继续下载
+        已存在且大小、ETag与服务器一致的文件直接跳过
+        :param max_workers: 同时下载的文件数
+        :param per_host: 每个host同时下载的文件数
+        :param chunk_size: 每次读取写入的字节数
+        :param timeout: 连接和读取的超时时间（秒）
+        :param media_store: 传入时按媒体id去重，仓库中已有的媒体直接链接，不再下载
+        :param retries: 每个文件失败后的重试次数
+        :param backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+        :param max_backoff: 重试等待时间的上限（秒）
+        :param bandwidth_limit: 所有下载合计每秒最多下载的字节数，默认不限制
+        :param segments: 分段下载（如视频）时每个文件最多同时下载的段数
+        :param segment_size: 分段下载时每段的最小字节数，小于两段的文件不分段
+        :param segment_workers: 所有分段下载共用的线程数
+    """
+    def __init__(self, max_workers: int = 32, per_host: int = 16, chunk_size: int = 64 * 1024, timeout: float = 30, media_store: Media_Store = None,
+                 retries: int = 3, backoff: float = 1, max_backoff: float = 30, bandwidth_limit: int = None,
+                 segments: int = 4, segment_size: int = 4 * 1024 * 1024, segment_workers: int = 8):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.media_store = media_store
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bandwidth_limiter = Bandwidth_Limiter(bandwidth_limit) if bandwidth_limit else None
+        self.segments = segments
+        self.segment_size = segment_size
+        self.segment_executor = ThreadPoolExecutor(max_workers=segment_workers, thread_name_prefix='download-segment')
+        self.session_pool = Session_Pool(pool_connections=10, pool_maxsize=max(per_host, 10))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+        self.host_semaphores = {}
+        self.lock = threading.Lock()
+
+    def set_bandwidth_limit(self, bytes_per_second: int = None):
+        """
+            设置所有下载合计的带宽上限（字节/秒），None为不限制
+        """
+        self.bandwidth_limiter = Bandwidth_Limiter(bytes_per_second) if bytes_per_second else None
+
+    def get_host_semaphore(self, url: str):
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            semaphore = self.host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self.host_semaphores[host] = semaphore
+            return semaphore
+
+    def _get_meta(self, file_path: str):
+        meta_path = os.path.join(os.path.dirname(file_path), META_FILE_NAME)
+        with self.lock:
+            try:
+                with open(meta_path, mode='r', encoding='utf-8') as f:
+                    return json.load(f).get(os.path.basename(file_path), {})
+            except (OSError, ValueError):
+                return {}
+
+    def _set_meta(self, file_path: str, value: dict = None):
+        """
+            记录文件的大小和ETag，value为None时删除记录
+        """
+        meta_path = os.path.join(os.path.dirname(file_path), META_FILE_NAME)
+        name = os.path.basename(file_path)
+        with self.lock:
+            try:
+                with open(meta_path, mode='r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+            if value is None:
+                if name not in meta:
+                    return
+                meta.pop(name)
+            else:
+                meta[name] = value
+            with open(meta_path + '.tmp', mode='w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + '.tmp', meta_path)
+
+    def _send(self, method: str, url: str, proxies=None, headers: dict = None):
+        def send(proxies):
+            return self.session_pool.get(proxies).request(method, url, headers=headers, proxies=proxies, stream=True, timeout=self.timeout)
+        return send_with_proxies(send, proxies)
+
+    def _head(self, url: str, proxies=None):
+        """
+            返回 (文件大小, ETag, 是否支持Range)
+        """
+        with self.get_host_semaphore(url):
+            with self._send('HEAD', url, proxies) as res:
+                res.raise_for_status()
+                size = res.headers.get('Content-Length')
+                return int(size) if size is not None else None, res.headers.get('ETag'), res.headers.get('Accept-Ranges') == 'bytes'
+
+    def is_downloaded(self, url: str, file_path: str, proxies=None):
+        """
+            文件已存在，且大小和ETag（记录过时）与服务器一致
+        """
+        if not os.path.exists(file_path):
+            return False
+        try:
+            size, etag, _ = self._head(url, proxies)
+        except Exception:
+            return False
+        if size is None or size != os.path.getsize(file_path):
+            return False
+        saved_etag = self._get_meta(file_path).get('etag')
+        return not (etag and saved_etag and etag != saved_etag)
+
+    def download(self, url: str, file_path: str, proxies=None, progress: Download_Progress = None, segmented: bool = False):
+        """
+            下载单个文件到 file_path，返回文件大小，跳过或从媒体仓库链接时返回0
+            :param proxies: 代理字典或 Proxy_Pool
+            :param progress: 传入时实时累加下载的字节数
+            :param segmented: 是否按 Range 分段并行下载，适合视频等大文件
+        """
+        tmp_path = file_path + '.part'
+        fetch = self._fetch_segmented if segmented else self._fetch_with_retry
+        if self.media_store is None:
+            if self.is_downloaded(url, file_path, proxies):
+                return 0
+            etag = fetch(url, tmp_path, proxies, progress)
+            os.replace(tmp_path, file_path)
+            size = os.path.getsize(file_path)
+            self._set_meta(file_path, {'size': size, 'etag': etag})
+            return size
+        media_id = get_media_id(url)
+        if media_id is None:
+            fetch(url, tmp_path, proxies, progress)
+            size = os.path.getsize(tmp_path)
+            self.media_store.add(None, tmp_path, file_path)
+            return size
+        with self.media_store.lock_id(media_id):
+            if self.media_store.link(media_id, file_path):
+                return 0
+            fetch(url, tmp_path, proxies, progress)
+            size = os.path.getsize(tmp_path)
+            self.media_store.add(media_id, tmp_path, file_path)
+        return size
+
+    def _retry(self, url: str, func, *args):
+        """
+            失败时等待后重试 func，等待时间指数增长，一半固定一半随机，避免大量失败的文件同时重试
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                logger.warning(f'下载失败 {url}: {e}，{delay:.1f}秒后第{attempt + 1}次重试')
+                time.sleep(delay)
+
+    def _write_stream(self, res, f, progress: Download_Progress = None):
+        size = 0
+        for data in res.iter_content(chunk_size=self.chunk_size):
+            if self.bandwidth_limiter is not None:
+                self.bandwidth_limiter.consume(len(data))
+            f.write(data)
+            size += len(data)
+            if progress is not None:
+                progress.add_bytes(len(data))
+        return size
+
+    def _fetch_with_retry(self, url: str, tmp_path: str, proxies=None, progress: Download_Progress = None):
+        """
+            下载到临时文件，失败时保留已下载的部分，等待后从断点继续，返回ETag
+        """
+        etag = self._retry(url, self._fetch, url, tmp_path, proxies, progress)
+        self._set_meta(tmp_path, None)
+        return etag
+
+    def _fetch(self, url: str, tmp_path: str, proxies=None, progress: Download_Progress = None):
+        offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+        headers = {}
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            # ETag变化时服务器会返回完整的新文件，而不是把新文件的后半段拼到旧文件上
+            partial_etag = self._get_meta(tmp_path).get('etag')
+            if partial_etag:
+                headers['If-Range'] = partial_etag
+        with self.get_host_semaphore(url):
+            with self._send('GET', url, proxies, headers) as res:
+                if res.status_code == 416:
+                    # 临时文件比服务器上的文件还大，只能重新下载
+                    os.remove(tmp_path)
+                res.raise_for_status()
+                content_range = res.headers.get('Content-Range', '')
+                if res.status_code != 206 or not content_range.startswith(f'bytes {offset}-'):
+                    offset = 0
+                etag = res.headers.get('ETag')
+                if offset == 0 and etag:
+                    self._set_meta(tmp_path, {'etag': etag})
+                expected = res.headers.get('Content-Length')
+                with open(tmp_path, mode='ab' if offset > 0 else 'wb') as f:
+                    size = self._write_stream(res, f, progress)
+                if expected is not None and size != int(expected):
+                    raise IOError(f'连接中断，已下载 {offset + size} 字节')
+        return etag
+
+    def _fetch_segmented(self, url: str, tmp_path: str, proxies=None, progress: Download_Progress = None):
+        """
+            按 Range 把文件分成若干段并行下载，每段写入单独的临时文件，全部完成后按顺序合并
+            中断后再次下载时，ETag和大小不变的段从已下载的位置继续
+            服务器不支持 Range 或文件较小时退化为普通下载，返回ETag
+        """
+        try:
+            size, etag, accept_ranges = self._retry(url, self._head, url, proxies)
+        except Exception:
+            size, etag, accept_ranges = None, None, False
+        if not size or not accept_ranges or size < 2 * self.segment_size:
+            return self._fetch_with_retry(url, tmp_path, proxies, progress)
+        count = min(self.segments, size // self.segment_size)
+        segment_paths = [f'{tmp_path}.{index}' for index in range(count)]
+        saved = self._get_meta(tmp_path)
+        if saved.get('size') != size or saved.get('etag') != etag or saved.get('count') != count:
+            for segment_path in segment_paths:
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
+            self._set_meta(tmp_path, {'size': size, 'etag': etag, 'count': count})
+        bounds = [(size * index // count, size * (index + 1) // count - 1) for index in range(count)]
+        futures = [self.segment_executor.submit(self._retry, url, self._fetch_segment, url, segment_path, start, end, etag, proxies, progress)
+                   for segment_path, (start, end) in zip(segment_paths, bounds)]
+        wait(futures)
+        for future in futures:
+            future.result()
+        with open(tmp_path, mode='wb') as f:
+            for segment_path in segment_paths:
+                with open(segment_path, mode='rb') as segment:
+                    for data in iter(lambda: segment.read(1024 * 1024), b''):
+                        f.write(data)
+        for segment_path in segment_paths:
+            os.remove(segment_path)
+        self._set_meta(tmp_path, None)
+        return etag
+
+    def _fetch_segment(self, url: str, segment_path: str, start: int, end: int, etag: str = None, proxies=None, progress: Download_Progress = None):
+        length = end - start + 1
+        offset = os.path.getsize(segment_path) if os.path.exists(segment_path) else 0
+        if offset > length:
+            os.remove(segment_path)
+            offset = 0
+        if offset == length:
+            return
+        headers = {'Range': f'bytes={start + offset}-{end}'}
+        if etag:
+            headers['If-Range'] = etag
+        with self.get_host_semaphore(url):
+            with self._send('GET', url, proxies, headers) as res:
+                res.raise_for_status()
+                if res.status_code != 206 or not res.headers.get('Content-Range', '').startswith(f'bytes {start + offset}-'):
+                    raise IOError('服务器没有按 Range 返回分段，文件可能已变化')
+                with open(segment_path, mode='ab') as f:
+                    size = self._write_stream(res, f, progress)
+        if offset + size != length:
+            raise IOError(f'连接中断，分段已下载 {offset + size}/{length} 字节')
+
+    def _download_task(self, url, file_path, proxies, progress, segmented=False):
+        try:
+            self.download(url, file_path, proxies, progress, segmented)
+            success, msg = True, file_path
+        except Exception as e:
+            success, msg = False, str(e)
+            logger.warning(f'下载失败 {url}: {e}')
+        progress.finish(success)
+        return success, msg
+
+    def download_many(self, tasks: list, proxies=None, callback=None, segmented: bool = False):
+        """
+            并行下载多个文件，耗时约等于最慢的一个文件
+            :param tasks: [(url, file_path), ...]
+            :param callback: 每个文件完成后调用 callback(progress)
+            :param segmented: 是否对每个文件分段下载
+            按输入顺序返回 [(success, file_path 或 错误信息), ...] 和进度
+        """
+        progress = Download_Progress(len(tasks), callback)
+        futures = [self.executor.submit(self._download_task, url, file_path, proxies, progress, segmented) for url, file_path in tasks]
+        results = [future.result() for future in futures]
+        return results, progress
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.segment_executor.shutdown(wait=True)
+        self.session_pool.close()
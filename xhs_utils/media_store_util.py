@@ -0,0 +1,108 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import urllib.parse
+
+"""
+    按内容寻址的媒体仓库，同一张图片（如多篇笔记共用的头像、转发的图片）只下载和保存一次
+    目录结构:
+        objects/ab/<sha256>   文件内容，按内容的sha256命名
+        ids/<媒体id>          指向对应object的硬链接，用于在下载前判断是否已经下载过
+    笔记文件夹中的文件是object的硬链接，不占用额外的磁盘空间；不支持硬链接的文件系统会退化为复制
+"""
+
+
+def get_media_id(url: str):
+    """
+        从小红书的媒体url中解析稳定的媒体id，与 XHS_Apis.get_note_no_water_img 的解析方式一致
+        url中的时间戳和签名部分会变化，不参与id；不同尺寸的参数（如 imageView2/2/w/120）会区分为不同id
+        https://sns-webpic-qc.xhscdn.com/202403181511/64ad2ea67ce04159170c686a941354f5/1040g008310cs1hii6g6g5ngacg208q5rlf1gld8!nd_dft_wlteh_webp_3
+            -> 1040g008310cs1hii6g6g5ngacg208q5rlf1gld8
+    """
+    url_parse = urllib.parse.urlparse(url)
+    segments = [segment for segment in url_parse.path.split('/') if segment]
+    if not segments:
+        return None
+    media_id = segments[-1].split('!')[0]
+    if 'spectrum' in segments[:-1]:
+        media_id = 'spectrum_' + media_id
+    suffix = segments[-1][len(segments[-1].split('!')[0]):] + url_parse.query
+    if suffix:
+        media_id += '_' + hashlib.md5(suffix.encode('utf-8')).hexdigest()[:8]
+    media_id = re.sub(r'[^0-9A-Za-z_.-]', '_', media_id)
+    return media_id or None
+
+
+def link_or_copy(src: str, dst: str):
+    """
+        创建硬链接，目标已存在时覆盖；不支持硬链接时复制
+    """
+    tmp_dst = dst + '.link'
+    if os.path.exists(tmp_dst):
+        os.remove(tmp_dst)
+    try:
+        os.link(src, tmp_dst)
+    except OSError:
+        shutil.copyfile(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+
+class Media_Store():
+    """
+        :param root: 仓库的根目录，与媒体保存目录在同一个磁盘上时才能使用硬链接
+        :param lock_num: 媒体id锁的数量，不同的媒体id按哈希共用固定数量的锁，数量应远大于同时下载的文件数
+    """
+    def __init__(self, root: str, lock_num: int = 256):
+        self.root = root
+        self.objects_path = os.path.join(root, 'objects')
+        self.ids_path = os.path.join(root, 'ids')
+        self.id_locks = [threading.Lock() for _ in range(lock_num)]
+
+    def lock_id(self, media_id: str):
+        """
+            同一个媒体id同时只有一个线程下载，其他线程等待后直接使用下载结果
+            锁的数量固定，内存占用不随媒体数增长；哈希到同一个锁的不同媒体偶尔会排队下载
+        """
+        return self.id_locks[hash(media_id) % len(self.id_locks)]
+
+    def id_path(self, media_id: str):
+        return os.path.join(self.ids_path, media_id)
+
+    def object_path(self, digest: str):
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    def has(self, media_id: str):
+        return os.path.exists(self.id_path(media_id))
+
+    def link(self, media_id: str, file_path: str):
+        """
+            媒体已在仓库中时链接到 file_path 并返回True，否则返回False
+        """
+        id_path = self.id_path(media_id)
+        if not os.path.exists(id_path):
+            return False
+        if os.path.exists(file_path) and os.path.samefile(id_path, file_path):
+            return True
+        link_or_copy(id_path, file_path)
+        return True
+
+    def add(self, media_id: str, tmp_path: str, file_path: str):
+        """
+            把下载好的临时文件放入仓库，内容相同的文件只保留一份，然后链接到 file_path
+        """
+        sha256 = hashlib.sha256()
+        with open(tmp_path, mode='rb') as f:
+            for data in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(data)
+        object_path = self.object_path(sha256.hexdigest())
+        if os.path.exists(object_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            shutil.move(tmp_path, object_path)
+        if media_id is not None:
+            os.makedirs(self.ids_path, exist_ok=True)
+            link_or_copy(object_path, self.id_path(media_id))
+        link_or_copy(object_path, file_path)
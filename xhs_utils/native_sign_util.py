@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+"""
+    static/xhs_xs_xsc_56.js 的纯python实现（signXs / XsCommon）
+    不依赖node，单次签名不到1毫秒
+    以及 static/xhs_xray.js 中 traceId 的实现
+    与js实现的差分测试见 tests/test_native_sign_util.py（需要node）: python -m pytest tests/test_native_sign_util.py
+"""
+
+BASE64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+CUSTOM_BASE64_ALPHABET = "ZmserbBoHQtNP+wOcza/LpngG8yJq42KWYj0DSfdikx3VT16IlUAFM97hECvuRX5"
+X3_BASE64_ALPHABET = "MfgqrsbcyzPQRStuvC7mn501HIJBo2DEFTKdeNOwxWXYZap89+/A4UVLhijkl63G"
+CUSTOM_BASE64_TABLE = str.maketrans(BASE64_ALPHABET, CUSTOM_BASE64_ALPHABET)
+X3_BASE64_TABLE = str.maketrans(BASE64_ALPHABET, X3_BASE64_ALPHABET)
+HEX_KEY_BYTES = bytes.fromhex(
+    "71a302257793271ddd273bcee3e4b98d9d7935e1da33f5765e2ea8afb6dc77a51a499d23b67c20660025860cbf13d4540d92497f58686c574e508f46e1956344f39139bf4faf22a3eef120b79258145b2feb5193b6478669961298e79bedca646e1a693a926154a5a7a1bd1cf0dedb742f917a747a1e388b234f2277"
+)
+VERSION_BYTES = bytes([119, 104, 96, 41])
+ENV_FINGERPRINT_XOR_KEY = 41
+SEQUENCE_VALUE_MIN, SEQUENCE_VALUE_MAX = 15, 50
+WINDOW_PROPS_LENGTH_MIN, WINDOW_PROPS_LENGTH_MAX = 900, 1200
+CHECKSUM_VERSION = 1
+CHECKSUM_XOR_KEY = 115
+CHECKSUM_FIXED_TAIL = bytes([249, 65, 103, 103, 201, 181, 131, 99, 94, 7, 68, 250, 132, 21])
+ENV_FINGERPRINT_TIME_OFFSET_MIN, ENV_FINGERPRINT_TIME_OFFSET_MAX = 10, 50
+X3_PREFIX = "mns0301_"
+XYS_PREFIX = "XYS_"
+XS_COMMON_FP = "I38rHdgsjopgIvesdVwgIC+oIELmBZ5e3VwXLgFTIxS3bqwErFeexd0ekncAzMFYnqthIhJeSnMDKutRI3KsYorWHPtGrbV0P9WfIi/eWc6eYqtyQApPI37ekmR6QL+5Ii6sdneeSfqYHqwl2qt5B0DBIx++GDi/sVtkIxdsxuwr4qtiIhuaIE3e3LV0I3VTIC7e0utl2ADmsLveDSKsSPw5IEvsiVtJOqw8BuwfPpdeTFWOIx4TIiu6ZPwbPut5IvlaLbgs3qtxIxes1VwHIkumIkIyejgsY/WTge7eSqte/D7sDcpipedeYrDtIC6eDVw2IENsSqtlnlSuNjVtIvoekqt3cZ7sVo4gIESyIhE4NnquIxhnqz8gIkIfoqwkICZW8g3sdlOeVPw3IvAe0fged0YyIi5s3Mc52utAIiKsidvekZNeTPt4nAOeWPwEIvSzaAdeSVwXpnesDqwmI3TrIxE5Luwwaqw+rekhZANe1MNe0Pw9ICNsVLoeSbIFIkosSr7sVnFiIkgsVVtMIiudqqw+tqtWI30e3PwIIhoe3ut1IiOsjut3wutnsPwXICclI3Ir27lk2I5e1utCIES/IEJs0PtnpYIAO0JeYfD1IErPOPtKoqw3I3OexqtWQL5eiz0sVSEyIEJekd/skPtsnPwqICJeSPwiIh5eVAuLIv5eYo/e0PtSICKsVqwV4omqI3RIIkge0e0sYZ0si/7eiuwSIvTeIhqmGuwCIkrPIx0edUzbzbveTPw5IxI0yVwImZeedM0eWVwmeqt2IiM9IhhQLqwJPqtbIxZ="
+CRC_POLY = 0xedb88320
+
+
+def _make_crc_table():
+    table = []
+    for n in range(256):
+        r = n
+        for _ in range(8):
+            r = (r >> 1) ^ CRC_POLY if r & 1 else r >> 1
+        table.append(r)
+    return table
+
+
+CRC_TABLE = _make_crc_table()
+
+
+def rand32():
+    return int.from_bytes(os.urandom(4), 'little')
+
+
+def js_json_dumps(data):
+    # 与 JSON.stringify 的输出保持一致（紧凑格式，不转义非ascii字符）
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def int_to_le(val, length=4):
+    return (val & 0xffffffff).to_bytes(4, 'little')[:length]
+
+
+def build_content_string(method, uri, payload):
+    payload = payload or {}
+    if method == 'POST':
+        return uri + js_json_dumps(payload)
+    if not payload:
+        return uri
+    parts = []
+    for key, value in payload.items():
+        if isinstance(value, list):
+            value_str = ','.join('' if v is None else str(v) for v in value)
+        elif value is None:
+            value_str = ''
+        else:
+            value_str = str(value)
+        parts.append(f'{key}={value_str.replace("=", "%3D")}')
+    return uri + '?' + '&'.join(parts)
+
+
+def env_fingerprint_a(ts, xor_key):
+    data = bytearray(ts.to_bytes(8, 'little'))
+    sum1 = data[1] + data[2] + data[3] + data[4]
+    sum2 = data[5] + data[6] + data[7]
+    data[0] = ((sum1 & 0xff) + sum2) & 0xff
+    return bytes(b ^ xor_key for b in data)
+
+
+def build_payload(d_hex, a1, app_id, content, timestamp, rand=rand32):
+    seed_bytes = int_to_le(rand())
+    seed_byte0 = seed_bytes[0]
+    time_offset = ENV_FINGERPRINT_TIME_OFFSET_MIN + rand() % (ENV_FINGERPRINT_TIME_OFFSET_MAX - ENV_FINGERPRINT_TIME_OFFSET_MIN + 1)
+    sequence_value = SEQUENCE_VALUE_MIN + rand() % (SEQUENCE_VALUE_MAX - SEQUENCE_VALUE_MIN + 1)
+    window_props_length = WINDOW_PROPS_LENGTH_MIN + rand() % (WINDOW_PROPS_LENGTH_MAX - WINDOW_PROPS_LENGTH_MIN + 1)
+    md5_bytes = bytes.fromhex(d_hex)
+    payload = bytearray(VERSION_BYTES)
+    payload += seed_bytes
+    payload += env_fingerprint_a(timestamp, ENV_FINGERPRINT_XOR_KEY)
+    payload += (timestamp - time_offset).to_bytes(8, 'little')
+    payload += int_to_le(sequence_value)
+    payload += int_to_le(window_props_length)
+    payload += int_to_le(len(content.encode('utf-8')))
+    payload += bytes(b ^ seed_byte0 for b in md5_bytes[:8])
+    payload.append(52)
+    payload += a1.encode('utf-8')[:52].ljust(52, b'\x00')
+    payload.append(10)
+    payload += app_id.encode('utf-8')[:10].ljust(10, b'\x00')
+    payload.append(1)
+    payload.append(CHECKSUM_VERSION)
+    payload.append(seed_byte0 ^ CHECKSUM_XOR_KEY)
+    payload += CHECKSUM_FIXED_TAIL
+    return payload
+
+
+def sign_xs(method, uri, a1, xsec_appid='xhs-pc-web', payload=None, timestamp=None, rand=rand32):
+    """
+        生成x-s，对应js中的 signXs
+        :param timestamp: 毫秒时间戳，默认当前时间
+        :param rand: 返回32位无符号随机数的函数，默认 os.urandom
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    method = method.upper()
+    content = build_content_string(method, uri, payload)
+    d_hex = hashlib.md5(content.encode('utf-8')).hexdigest()
+    payload_bytes = build_payload(d_hex, a1.strip(), xsec_appid.strip(), content, timestamp, rand)
+    xor_bytes = bytes(b ^ k for b, k in zip(payload_bytes[:124], HEX_KEY_BYTES))
+    x3_body = base64.b64encode(xor_bytes).decode().translate(X3_BASE64_TABLE)
+    template = {
+        'x0': '4.2.6',
+        'x1': 'xhs-pc-web',
+        'x2': 'Windows',
+        'x3': X3_PREFIX + x3_body,
+        'x4': '',
+    }
+    encoded = base64.b64encode(js_json_dumps(template).encode('utf-8')).decode().translate(CUSTOM_BASE64_TABLE)
+    return XYS_PREFIX + encoded
+
+
+def crc32_js(text):
+    c = 0xffffffff
+    for ch in text:
+        c = CRC_TABLE[(c ^ ord(ch)) & 0xff] ^ (c >> 8)
+    c = (0xffffffff ^ c ^ CRC_POLY) & 0xffffffff
+    # js 的位运算结果是有符号的32位整数
+    return c - 0x100000000 if c & 0x80000000 else c
+
+
+def xs_common(a1, xs, xt):
+    """
+        生成x-s-common，对应js中的 XsCommon
+    """
+    data = {
+        's0': 5,
+        's1': '',
+        'x0': '1',
+        'x1': '4.2.6',
+        'x2': 'Windows',
+        'x3': 'xhs-pc-web',
+        'x4': '4.84.1',
+        'x5': a1,
+        'x6': xt,
+        'x7': xs,
+        'x8': XS_COMMON_FP,
+        'x9': crc32_js(str(xt) + xs + XS_COMMON_FP),
+        'x10': 0,
+        'x11': 'normal',
+    }
+    return base64.b64encode(js_json_dumps(data).encode('utf-8')).decode().translate(CUSTOM_BASE64_TABLE)
+
+
+def get_request_headers_params(api, data, a1, method='POST', timestamp=None, rand=rand32):
+    """
+        对应js中的 get_request_headers_params，返回 xs xt xs_common
+    """
+    xs = sign_xs(method, api, a1, 'xhs-pc-web', data, timestamp, rand)
+    xt = int(time.time() * 1000) if timestamp is None else timestamp
+    return {
+        'xs': xs,
+        'xt': xt,
+        'xs_common': xs_common(a1, xs, xt),
+    }
+
+
+TRACE_ID_MAX_SEQ = 2 ** 23 - 1
+_trace_id_seq = random.getrandbits(23)
+_trace_id_lock = threading.Lock()
+
+
+def trace_id(timestamp=None, rand=rand32):
+    """
+        生成x-xray-traceid，对应xray中的 traceId
+        前16位为 (毫秒时间戳 << 23 | 自增序号)，后16位为64位随机数
+        :param rand: 返回32位无符号随机数的函数，与js一样先取低32位再取高32位
+    """
+    global _trace_id_seq
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    with _trace_id_lock:
+        if _trace_id_seq > TRACE_ID_MAX_SEQ:
+            _trace_id_seq = 0
+        seq = _trace_id_seq
+        _trace_id_seq += 1
+    high = ((timestamp << 23) | seq) & 0xffffffffffffffff
+    low_bits = rand()
+    low = (rand() << 32) | low_bits
+    return f'{high:016x}{low:016x}'
+
@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+    通用的翻页引擎，把按cursor翻页的接口变成逐条产出数据的生成器
+    fetch_page(cursor) 请求一页，返回接口的 (success, msg, res_json)
+    parse_page(res_json, cursor) 解析一页，返回 (数据列表, 下一页的cursor)，没有下一页时cursor为None
+    调用方同时最多持有两页数据（当前页和预取的下一页），内存占用与总条数无关
+    用法:
+        for note in xhs_apis.iter_user_notes(user_url, cookies_str, max_items=100, prefetch=True):
+            ...
+"""
+
+
+def cursor_page(items_key: str):
+    """
+        大多数接口的翻页方式: data[items_key] 为数据，data['cursor'] 为下一页，data['has_more'] 为是否还有下一页
+    """
+    def parse_page(res_json, cursor):
+        data = res_json["data"]
+        items = data.get(items_key) or []
+        if 'cursor' not in data or not items or not data.get("has_more"):
+            return items, None
+        return items, str(data["cursor"])
+    return parse_page
+
+
+def number_page(items_key: str):
+    """
+        按页码翻页的接口（如搜索），cursor 为页码，没有 items_key 时说明没有更多结果
+    """
+    def parse_page(res_json, page):
+        data = res_json["data"]
+        if items_key not in data:
+            return [], None
+        items = data[items_key]
+        if not items or not data.get("has_more"):
+            return items, None
+        return items, page + 1
+    return parse_page
+
+
+class Paginator():
+    """
+        :param fetch_page: fetch_page(cursor) 返回 (success, msg, res_json)，失败时迭代抛出异常
+        :param parse_page: parse_page(res_json, cursor) 返回 (数据列表, 下一页的cursor)
+        :param cursor: 第一页的cursor
+        :param max_items: 最多产出多少条，None 为不限
+        :param stop_when: stop_when(item) 返回True时停止翻页，该条不产出
+        :param filter_page: filter_page(items) 返回 (保留的数据, 是否停止翻页)，用于需要跨页保存状态的过滤
+        :param prefetch: 调用方处理当前页时在后台线程请求下一页
+        :param on_page: on_page(res_json, cursor) 每页请求成功后调用，如保存接口返回的原始json
+    """
+    def __init__(self, fetch_page, parse_page, cursor='', max_items: int = None, stop_when=None, filter_page=None, prefetch: bool = False, on_page=None):
+        self.fetch_page = fetch_page
+        self.parse_page = parse_page
+        self.cursor = cursor
+        self.max_items = max_items
+        self.stop_when = stop_when
+        self.filter_page = filter_page
+        self.prefetch = prefetch
+        self.on_page = on_page
+        self.pages = 0
+        self.count = 0
+        self.msg = 'success'
+
+    def _fetch(self, cursor):
+        success, msg, res_json = self.fetch_page(cursor)
+        if not success:
+            raise Exception(msg)
+        self.msg = msg
+        if self.on_page is not None:
+            self.on_page(res_json, cursor)
+        return res_json
+
+    def _parse(self, res_json, cursor):
+        items, next_cursor = self.parse_page(res_json, cursor)
+        self.pages += 1
+        if self.filter_page is not None:
+            items, stop = self.filter_page(items)
+            if stop:
+                next_cursor = None
+        return items, next_cursor
+
+    def _need_next(self, items):
+        # 当前页已经够 max_items 时不预取，避免多发一次请求
+        return self.max_items is None or self.count + len(items) < self.max_items
+
+    def __iter__(self):
+        self.pages = 0
+        self.count = 0
+        if self.max_items is not None and self.max_items <= 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='paginator') if self.prefetch else None
+        future = None
+        cursor = self.cursor
+        try:
+            while cursor is not None:
+                res_json = future.result() if future is not None else self._fetch(cursor)
+                future = None
+                items, cursor = self._parse(res_json, cursor)
+                if cursor is not None and executor is not None and self._need_next(items):
+                    future = executor.submit(self._fetch, cursor)
+                for item in items:
+                    if self.stop_when is not None and self.stop_when(item):
+                        return
+                    self.count += 1
+                    yield item
+                    if self.max_items is not None and self.count >= self.max_items:
+                        return
+        finally:
+            if future is not None:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+
+class Async_Paginator(Paginator):
+    """
+        Paginator 的异步版本，fetch_page 为协程函数，使用 async for 迭代，预取在事件循环的任务中进行
+    """
+    async def _fetch(self, cursor):
+        success, msg, res_json = await self.fetch_page(cursor)
+        if not success:
+            raise Exception(msg)
+        self.msg = msg
+        if self.on_page is not None:
+            self.on_page(res_json, cursor)
+        return res_json
+
+    def __iter__(self):
+        raise TypeError('Async_Paginator 需要使用 async for 迭代')
+
+    async def __aiter__(self):
+        self.pages = 0
+        self.count = 0
+        if self.max_items is not None and self.max_items <= 0:
+            return
+        task = None
+        cursor = self.cursor
+        try:
+            while cursor is not None:
+                res_json = await task if task is not None else await self._fetch(cursor)
+                task = None
+                items, cursor = self._parse(res_json, cursor)
+                if cursor is not None and self.prefetch and self._need_next(items):
+                    task = asyncio.ensure_future(self._fetch(cursor))
+                for item in items:
+                    if self.stop_when is not None and self.stop_when(item):
+                        return
+                    self.count += 1
+                    yield item
+                    if self.max_items is not None and self.count >= self.max_items:
+                        return
+        finally:
+            if task is not None:
+                task.cancel()
+
+
+def collect(paginator: Paginator):
+    """
+        把翻页结果收集为列表，返回与其他接口一致的 (success, msg, 数据列表)，出错时返回已获取的部分
+    """
+    items = []
+    try:
+        for item in paginator:
+            items.append(item)
+        success, msg = True, paginator.msg
+    except Exception as e:
+        success, msg = False, str(e)
+    return success, msg, items
+
+
+async def collect_async(paginator: Async_Paginator):
+    """
+        collect 的异步版本
+    """
+    items = []
+    try:
+        async for item in paginator:
+            items.append(item)
+        success, msg = True, paginator.msg
+    except Exception as e:
+        success, msg = False, str(e)
+    return success, msg, items
@@ -0,0 +1,239 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from loguru import logger
+
+"""
+    列式存储，把用户、笔记和评论写成Parquet文件，方便用pandas / pyarrow / duckdb 分析
+    数量字段转为整数，上传时间转为时间戳，标签和图片保存为列表，读取时不需要再解析字符串
+    按 用户 和 爬取日期 分区保存:
+        {root}/notes/user={用户id}/date={爬取日期}/part-{时间}-{序号}.parquet
+        评论按所在笔记的作者分区，用户信息按用户本身分区
+    每个分区的数据攒够 row_group_size 行后作为一个row group写入
+    所有分区缓冲的总行数超过 max_buffered_rows 时写入缓冲最多的分区，内存占用不随分区数增长
+    写入中的文件以 . 开头，关闭后才重命名为 part-*.parquet；进程中途退出时留下的文件没有footer，
+    pandas / pyarrow 读取目录时会忽略以 . 开头的文件，所以不会读到损坏的文件（但其中的数据会丢失）
+    需要安装 pyarrow: pip install pyarrow
+    用法:
+        sink = Parquet_Sink('datas/parquet')
+        try:
+            sink.save_notes([note_info])
+        finally:
+            sink.close()  # 关闭后文件才完整可读，必须在finally中调用
+        df = pandas.read_parquet('datas/parquet/notes')
+"""
+
+
+def parse_count(value):
+    """
+        把接口返回的数量转换为整数: 123 / '123' / '1.2万' / '10+' / '1千+'，无法解析时返回None
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'^\s*([\d.]+)\s*(万|w|W|千|k|K)?\+?\s*$', str(value))
+    if not match:
+        return None
+    number = float(match.group(1))
+    unit = match.group(2)
+    if unit in ('万', 'w', 'W'):
+        number *= 10000
+    elif unit in ('千', 'k', 'K'):
+        number *= 1000
+    return int(number)
+
+
+def parse_time(value):
+    """
+        timestamp_to_str 格式的时间转换为datetime
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_list(value):
+    if value is None:
+        return []
+    return [str(item) for item in value]
+
+
+# 每个表的列名和类型，类型为 string / int / time / list
+USER_SCHEMA = [
+    ('user_id', 'string'), ('home_url', 'string'), ('nickname', 'string'), ('avatar', 'string'), ('red_id', 'string'),
+    ('gender', 'string'), ('ip_location', 'string'), ('desc', 'string'), ('follows', 'int'), ('fans', 'int'),
+    ('interaction', 'int'), ('tags', 'list'), ('crawl_time', 'time'),
+]
+NOTE_SCHEMA = [
+    ('note_id', 'string'), ('note_url', 'string'), ('note_type', 'string'), ('user_id', 'string'), ('home_url', 'string'),
+    ('nickname', 'string'), ('avatar', 'string'), ('title', 'string'), ('desc', 'string'), ('liked_count', 'int'),
+    ('collected_count', 'int'), ('comment_count', 'int'), ('share_count', 'int'), ('video_cover', 'string'),
+    ('video_addr', 'string'), ('image_list', 'list'), ('tags', 'list'), ('upload_time', 'time'), ('ip_location', 'string'),
+    ('crawl_time', 'time'),
+]
+COMMENT_SCHEMA = [
+    ('note_id', 'string'), ('note_url', 'string'), ('comment_id', 'string'), ('user_id', 'string'), ('home_url', 'string'),
+    ('nickname', 'string'), ('avatar', 'string'), ('content', 'string'), ('show_tags', 'list'), ('like_count', 'int'),
+    ('upload_time', 'time'), ('ip_location', 'string'), ('pictures', 'list'), ('crawl_time', 'time'),
+]
+CONVERTERS = {
+    'string': lambda value: None if value is None else str(value),
+    'int': parse_count,
+    'time': parse_time,
+    'list': parse_list,
+}
+
+
+class Parquet_Sink():
+    """
+        :param root: 保存的根目录
+        :param row_group_size: 每个分区攒够多少行写入一个row group
+        :param max_open_files: 同时打开的文件数，超过时关闭最久没有写入的分区，之后再写入该分区时生成新的文件
+        :param max_buffered_rows: 所有分区缓冲的总行数上限，超过时把缓冲最多的分区写入文件
+        与 Sqlite_Storage 有相同的 save_users / save_notes / save_comments 方法，可以作为 Data_Spider 的 storage
+    """
+    def __init__(self, root: str, row_group_size: int = 10000, max_open_files: int = 16, max_buffered_rows: int = 50000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet_Sink 需要安装 pyarrow: pip install pyarrow')
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.root = root
+        self.row_group_size = row_group_size
+        self.max_open_files = max_open_files
+        self.max_buffered_rows = max_buffered_rows
+        self.schemas = {
+            'users': (USER_SCHEMA, self._arrow_schema(USER_SCHEMA)),
+            'notes': (NOTE_SCHEMA, self._arrow_schema(NOTE_SCHEMA)),
+            'comments': (COMMENT_SCHEMA, self._arrow_schema(COMMENT_SCHEMA)),
+        }
+        # 评论按所在笔记的作者分区
+        self.note_authors = {}
+        self.buffers = {}
+        self.buffered_rows = 0
+        self.writers = OrderedDict()
+        self.file_index = 0
+        self.lock = threading.Lock()
+
+    def _arrow_schema(self, schema: list):
+        pa = self.pa
+        types = {
+            'string': pa.string(),
+            'int': pa.int64(),
+            'time': pa.timestamp('s'),
+            'list': pa.list_(pa.string()),
+        }
+        return pa.schema([(name, types[type]) for name, type in schema])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _partition_path(self, partition: tuple):
+        table, user_id, date = partition
+        return os.path.join(self.root, table, f'user={user_id or "unknown"}', f'date={date}')
+
+    def _save(self, table: str, datas, get_user_id):
+        schema, _ = self.schemas[table]
+        now = datetime.now().replace(microsecond=0)
+        date = now.strftime('%Y-%m-%d')
+        with self.lock:
+            full = []
+            for data in datas:
+                row = {name: CONVERTERS[type](data.get(name)) for name, type in schema if name != 'crawl_time'}
+                row['crawl_time'] = now
+                partition = (table, get_user_id(data), date)
+                buffer = self.buffers.setdefault(partition, [])
+                buffer.append(row)
+                self.buffered_rows += 1
+                if len(buffer) == self.row_group_size:
+                    full.append(partition)
+            for partition in full:
+                self._write(partition)
+            while self.buffered_rows > self.max_buffered_rows:
+                self._write(max(self.buffers, key=lambda partition: len(self.buffers[partition])))
+
+    def save_users(self, users):
+        self._save('users', users, lambda user: user.get('user_id'))
+
+    def save_notes(self, notes):
+        notes = list(notes)
+        with self.lock:
+            for note in notes:
+                self.note_authors[note['note_id']] = note.get('user_id')
+        self._save('notes', notes, lambda note: note.get('user_id'))
+
+    def save_comments(self, comments, note_user_id: str = None):
+        """
+            :param note_user_id: 评论所在笔记的作者，用于分区；None 时从本进程保存过的笔记中查找
+            断点续爬时笔记可能是上一次运行保存的，调用方应传入 note_user_id，否则会写入 user=unknown 分区
+        """
+        if note_user_id is not None:
+            get_user_id = lambda comment: note_user_id
+        else:
+            get_user_id = lambda comment: self.note_authors.get(comment.get('note_id'))
+        self._save('comments', comments, get_user_id)
+
+    def _get_writer(self, partition: tuple):
+        writer = self.writers.get(partition)
+        if writer is not None:
+            self.writers.move_to_end(partition)
+            return writer
+        while len(self.writers) >= self.max_open_files:
+            _, old_writer = self.writers.popitem(last=False)
+            self._close_writer(old_writer)
+        path = self._partition_path(partition)
+        os.makedirs(path, exist_ok=True)
+        self.file_index += 1
+        file_path = os.path.join(path, f'.part-{int(time.time() * 1000)}-{self.file_index}.parquet')
+        writer = self.pq.ParquetWriter(file_path, self.schemas[partition[0]][1], compression='zstd')
+        self.writers[partition] = writer
+        return writer
+
+    def _close_writer(self, writer):
+        """
+            关闭文件写入footer，然后去掉文件名开头的 . 使其可以被读取
+        """
+        writer.close()
+        path, file_name = os.path.split(writer.where)
+        os.replace(writer.where, os.path.join(path, file_name[1:]))
+
+    def _write(self, partition: tuple):
+        rows = self.buffers.pop(partition, None)
+        if not rows:
+            return
+        self.buffered_rows -= len(rows)
+        table = self.pa.Table.from_pylist(rows, schema=self.schemas[partition[0]][1])
+        self._get_writer(partition).write_table(table)
+
+    def flush(self):
+        """
+            把攒够 row_group_size 行的分区写入文件，不足的部分留在缓冲区，避免产生很小的row group
+            Parquet文件在 close() 后才可读，flush 不会让数据持久化
+        """
+        with self.lock:
+            for partition in [partition for partition, rows in self.buffers.items() if len(rows) >= self.row_group_size]:
+                self._write(partition)
+
+    def close(self):
+        """
+            写入所有剩余的数据并关闭所有文件，关闭后Parquet文件才有完整的元数据可以读取
+        """
+        with self.lock:
+            for partition in list(self.buffers):
+                self._write(partition)
+            for writer in self.writers.values():
+                self._close_writer(writer)
+            self.writers.clear()
+        logger.info(f'Parquet文件已保存至 {self.root}')
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+"""
+    按账号（cookies中的a1）和接口路径限速的令牌桶
+    请求失败（success为False）或返回 461 / 429 时降低速率，连续成功时缓慢恢复
+    取令牌只在锁内计算需要等待的时间，线程和asyncio协程都可以共用同一个限速器
+"""
+
+THROTTLE_STATUS_CODES = (429, 461)
+
+
+class Token_Bucket():
+    def __init__(self, rate: float, burst: int, min_rate: float, max_rate: float, increase: float, decrease: float):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = burst
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+            预约一个令牌，返回需要等待的秒数
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # 被限流后不再允许突发请求
+            self.tokens = min(self.tokens, 0)
+
+
+class Rate_Limiter():
+    """
+        :param rate: 每个账号每个接口的初始速率（次/秒）
+        :param burst: 允许的突发请求数
+        :param min_rate: 被限流后速率的下限
+        :param max_rate: 连续成功后速率的上限，默认为初始速率的2倍
+        :param increase: 每次成功后速率增加的值
+        :param decrease: 每次被限流后速率乘以的系数
+        :param endpoint_rates: 单独指定某些接口的初始速率，如 {'/api/sns/web/v1/feed': 1}
+    """
+    def __init__(self, rate: float = 2, burst: int = 3, min_rate: float = 0.1, max_rate: float = None,
+                 increase: float = 0.02, decrease: float = 0.5, endpoint_rates: dict = None):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.endpoint_rates = endpoint_rates or {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, a1: str, api: str):
+        path = api.split('?')[0]
+        key = (a1, path)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    rate = self.endpoint_rates.get(path, self.rate)
+                    max_rate = self.max_rate if self.max_rate is not None else rate * 2
+                    bucket = Token_Bucket(rate, self.burst, self.min_rate, max_rate, self.increase, self.decrease)
+                    self.buckets[key] = bucket
+        return bucket
+
+    def acquire(self, a1: str, api: str):
+        """
+            阻塞直到可以发送请求
+        """
+        wait = self.get_bucket(a1, api).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, a1: str, api: str):
+        """
+            acquire 的异步版本，等待时不阻塞事件循环
+        """
+        wait = self.get_bucket(a1, api).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def feedback(self, a1: str, api: str, success: bool, status_code: int = None):
+        """
+            根据请求结果调整速率
+        """
+        bucket = self.get_bucket(a1, api)
+        if success and status_code not in THROTTLE_STATUS_CODES:
+            bucket.on_success()
+        else:
+            bucket.on_throttle()
+
+    def get_rate(self, a1: str, api: str):
+        return self.get_bucket(a1, api).rate
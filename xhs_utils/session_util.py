@@ -0,0 +1,53 @@
+import json
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Session_Pool():
+    """
+        按代理区分的 requests.Session 池，复用keep-alive连接，避免每次请求都重新建立TCP和TLS连接
+        :param pool_connections: 每个session缓存的连接池（host）数量
+        :param pool_maxsize: 每个host最多保持的连接数，并发请求时应不小于并发数
+        :param keep_alive: 为False时每次请求后关闭连接
+    """
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, keep_alive: bool = True):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def _create_session(self, proxies: dict = None):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # cookies由每次请求单独传入，不在session中保存响应的cookies，避免多个账号之间串号
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if proxies:
+            session.proxies.update(proxies)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get(self, proxies: dict = None):
+        """
+            获取代理对应的session，不存在时创建
+        """
+        key = json.dumps(proxies, sort_keys=True) if proxies else ''
+        session = self.sessions.get(key)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self._create_session(proxies)
+                    self.sessions[key] = session
+        return session
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,300 @@
+import atexit
+import http.client
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from xhs_utils.native_sign_util import trace_id as native_trace_id
+
+static_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../static'))
+
+
+def get_sign_backend():
+    """
+        签名方式，通过环境变量 XHS_SIGN_BACKEND 配置
+        worker: 常驻node进程签名（默认）
+        native: 纯python实现x-s和x-s-common，不需要node（xray和创作者平台签名仍使用node进程）
+        execjs: 每次调用都启动一个新的node进程（旧方式）
+    """
+    return os.getenv('XHS_SIGN_BACKEND', 'worker').strip().lower()
+
+
+class Sign_Worker():
+    """
+        常驻的node签名进程，只加载一次 xhs_xs_xsc_56.js / xhs_xray.js / xhs_creator_xs.js
+        之后通过管道逐行收发json完成签名，避免execjs每次调用都重新启动node并加载xray的大文件
+    """
+    def __init__(self, node_path: str = 'node'):
+        self.node_path = node_path
+        self.worker_path = os.path.join(static_path, 'xhs_sign_worker.js')
+        self.process = None
+        self.request_id = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.node_path, self.worker_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=static_path,
+            encoding='utf-8',
+            bufsize=1,
+        )
+        logger.info(f'签名进程已启动 pid: {self.process.pid}')
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _request(self, request: dict):
+        with self.lock:
+            if not self.is_alive():
+                self.start()
+            self.request_id += 1
+            request['id'] = self.request_id
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+                line = self.process.stdout.readline()
+            except (BrokenPipeError, OSError) as e:
+                self._kill()
+                raise Exception(f'签名进程通信失败: {e}')
+            if not line:
+                self._kill()
+                raise Exception('签名进程异常退出')
+            response = json.loads(line)
+        if not response['ok']:
+            raise Exception(response['error'])
+        return response
+
+    def call(self, script: str, func: str, *args):
+        """
+            调用签名函数
+            :param script: 脚本名 xs / xray / creator
+            :param func: 脚本导出的函数名
+            :param args: 函数参数
+            返回函数的结果
+        """
+        return self._request({'script': script, 'func': func, 'args': list(args)})['result']
+
+    def call_many(self, calls: list):
+        """
+            批量调用签名函数，所有调用只需要一次进程间往返
+            :param calls: [(script, func, args), ...]
+            按顺序返回每个调用的结果
+        """
+        if not calls:
+            return []
+        batch = [{'script': script, 'func': func, 'args': list(args)} for script, func, args in calls]
+        results = []
+        for item in self._request({'batch': batch})['results']:
+            if not item['ok']:
+                raise Exception(item['error'])
+            results.append(item['result'])
+        return results
+
+    def _kill(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait()
+            except Exception:
+                pass
+        self.process = None
+
+    def close(self):
+        with self.lock:
+            if self.process is not None:
+                try:
+                    self.process.stdin.close()
+                    self.process.wait(timeout=3)
+                except Exception:
+                    self._kill()
+            self.process = None
+
+
+class Sign_Worker_Pool():
+    """
+        多个常驻签名进程组成的进程池，默认每个cpu核心一个
+        单次调用交给空闲的进程；批量调用按进程数切分，每个进程只需要一次往返
+    """
+    def __init__(self, size: int = None, node_path: str = 'node'):
+        self.size = size or os.cpu_count() or 1
+        self.workers = [Sign_Worker(node_path) for _ in range(self.size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def _run(self, method: str, *args):
+        worker = self.idle.get()
+        try:
+            return getattr(worker, method)(*args)
+        finally:
+            self.idle.put(worker)
+
+    def call(self, script: str, func: str, *args):
+        return self._run('call', script, func, *args)
+
+    def call_many(self, calls: list):
+        """
+            批量调用签名函数
+            :param calls: [(script, func, args), ...]
+            按顺序返回每个调用的结果
+        """
+        if not calls:
+            return []
+        chunk_num = min(self.size, len(calls))
+        chunk_size = (len(calls) + chunk_num - 1) // chunk_num
+        chunks = [calls[i:i + chunk_size] for i in range(0, len(calls), chunk_size)]
+        futures = [self.executor.submit(self._run, 'call_many', chunk) for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.executor.shutdown(wait=False)
+
+
+def get_sign_worker_num():
+    """
+        签名进程数量，通过环境变量 XHS_SIGN_WORKERS 配置
+        默认为cpu核心数，最多4个；设置为 auto 时每个cpu核心一个进程
+    """
+    num = os.getenv('XHS_SIGN_WORKERS', '').strip().lower()
+    if not num:
+        return min(os.cpu_count() or 1, 4)
+    if num == 'auto':
+        return os.cpu_count() or 1
+    return max(int(num), 1)
+
+
+class Sign_Client():
+    """
+        本机签名服务（sign_server.py）的客户端，与 Sign_Worker 提供相同的 call / call_many 方法
+        同一台机器上的多个爬虫进程共用一个已预热的签名服务，每个线程复用一个keep-alive连接
+    """
+    def __init__(self, server_url: str, timeout: float = 10):
+        url = urllib.parse.urlparse(server_url)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _post(self, path: str, body: dict):
+        payload = json.dumps(body)
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            if conn is None:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self.local.conn = conn
+            try:
+                conn.request('POST', path, payload, {'Content-Type': 'application/json'})
+                response = json.loads(conn.getresponse().read())
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise Exception(f'签名服务请求失败: {e}')
+        if not response['ok']:
+            raise Exception(response['error'])
+        return response
+
+    def call(self, script: str, func: str, *args):
+        return self._post('/call', {'script': script, 'func': func, 'args': list(args)})['result']
+
+    def call_many(self, calls: list):
+        if not calls:
+            return []
+        batch = [{'script': script, 'func': func, 'args': list(args)} for script, func, args in calls]
+        return self._post('/call_many', {'batch': batch})['results']
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+
+def create_local_sign_worker():
+    """
+        按 XHS_SIGN_WORKERS 创建本进程内的签名进程或签名进程池
+    """
+    worker_num = get_sign_worker_num()
+    if worker_num > 1:
+        return Sign_Worker_Pool(worker_num)
+    return Sign_Worker()
+
+
+_sign_worker = None
+_sign_worker_lock = threading.Lock()
+
+
+def get_sign_worker():
+    """
+        获取进程内共享的签名器，都提供 call / call_many 方法
+        配置了 XHS_SIGN_SERVER（如 http://127.0.0.1:5005）时使用本机签名服务
+        否则签名进程数（XHS_SIGN_WORKERS，默认为cpu核心数，最多4个）大于1时返回签名进程池，否则返回单个签名进程
+    """
+    global _sign_worker
+    if _sign_worker is None:
+        with _sign_worker_lock:
+            if _sign_worker is None:
+                server_url = os.getenv('XHS_SIGN_SERVER', '').strip()
+                if server_url:
+                    _sign_worker = Sign_Client(server_url)
+                else:
+                    _sign_worker = create_local_sign_worker()
+                atexit.register(_sign_worker.close)
+    return _sign_worker
+
+
+class Trace_Id_Pool():
+    """
+        x-xray-traceid 预取池
+        一次调用js批量生成 batch_size 个id，余量低于 low_water 时在后台线程补充
+        池子为空或补充失败时直接用python实现生成，构造请求头不会阻塞在js上
+        traceId 中包含生成时的时间戳，超过 max_age 秒的批次会被丢弃，批次超过一半 max_age 时提前在后台补充
+        默认批次较小，按需补充，发出的id与当前时间最多相差几秒
+    """
+    def __init__(self, fetch_func, batch_size: int = 200, low_water: int = 50, max_age: float = 3):
+        self.fetch_func = fetch_func
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_age = max_age
+        self.ids = deque()
+        self.filled_at = 0
+        self.refilling = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            age = time.time() - self.filled_at
+            if self.ids and age > self.max_age:
+                self.ids.clear()
+            if (len(self.ids) <= self.low_water or age > self.max_age / 2) and not self.refilling:
+                self.refilling = True
+                threading.Thread(target=self._refill, daemon=True).start()
+            if self.ids:
+                return self.ids.popleft()
+        return native_trace_id()
+
+    def _refill(self):
+        try:
+            ids = self.fetch_func(self.batch_size)
+            with self.lock:
+                self.ids = deque(ids)
+                self.filled_at = time.time()
+        except Exception as e:
+            logger.warning(f'批量生成traceId失败，暂时使用python实现: {e}')
+        finally:
+            with self.lock:
+                self.refilling = False
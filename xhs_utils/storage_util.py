@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+from xhs_utils.data_util import Xlsx_Writer
+
+"""
+    基于SQLite的数据存储，保存 handle_user_info / handle_note_info / handle_comment_info 处理后的数据
+    按 user_id / note_id / comment_id 做upsert，重复爬取时只更新变化的字段，不需要重写整个文件
+    写入先放入缓冲区，达到 batch_size 条后在一个事务中批量写入；列表字段（标签、图片等）以json保存
+    export_xlsx 可以从数据库重新生成与 save_to_xlsx 相同格式的表格
+    用法:
+        storage = Sqlite_Storage('datas/xhs_data.db')
+        storage.save_notes([note_info])
+        storage.close()
+"""
+
+# 列的顺序与 handle_*_info 返回的字典一致，导出xlsx时按这个顺序对应表头
+USER_COLUMNS = ['user_id', 'home_url', 'nickname', 'avatar', 'red_id', 'gender', 'ip_location', 'desc', 'follows', 'fans', 'interaction', 'tags']
+NOTE_COLUMNS = ['note_id', 'note_url', 'note_type', 'user_id', 'home_url', 'nickname', 'avatar', 'title', 'desc', 'liked_count', 'collected_count',
+                'comment_count', 'share_count', 'video_cover', 'video_addr', 'image_list', 'tags', 'upload_time', 'ip_location']
+COMMENT_COLUMNS = ['note_id', 'note_url', 'comment_id', 'user_id', 'home_url', 'nickname', 'avatar', 'content', 'show_tags', 'like_count',
+                   'upload_time', 'ip_location', 'pictures']
+JSON_COLUMNS = ('tags', 'image_list', 'show_tags', 'pictures')
+
+TABLES = {
+    'users': ('user_id', USER_COLUMNS),
+    'notes': ('note_id', NOTE_COLUMNS),
+    'comments': ('comment_id', COMMENT_COLUMNS),
+}
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS notes_user_id ON notes (user_id)',
+    'CREATE INDEX IF NOT EXISTS notes_upload_time ON notes (upload_time)',
+    'CREATE INDEX IF NOT EXISTS comments_note_id ON comments (note_id)',
+    'CREATE INDEX IF NOT EXISTS comments_user_id ON comments (user_id)',
+]
+
+
+def _to_row(data: dict, columns: list):
+    row = []
+    for column in columns:
+        value = data.get(column)
+        if column in JSON_COLUMNS and value is not None:
+            value = json.dumps(value, ensure_ascii=False)
+        row.append(value)
+    return row
+
+
+def _from_row(row: sqlite3.Row, columns: list):
+    data = {}
+    for column in columns:
+        value = row[column]
+        if column in JSON_COLUMNS and value is not None:
+            value = json.loads(value)
+        data[column] = value
+    return data
+
+
+class Sqlite_Storage():
+    """
+        :param db_path: 数据库文件路径
+        :param batch_size: 缓冲多少条数据后写入一次
+    """
+    def __init__(self, db_path: str, batch_size: int = 500):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.buffers = {table: {} for table in TABLES}
+        self.upsert_sql = {}
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            for table, (key, columns) in TABLES.items():
+                column_defs = ', '.join(f'"{column}" TEXT PRIMARY KEY' if column == key else f'"{column}"' for column in columns)
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({column_defs}, updated_at REAL)')
+                column_names = ', '.join(f'"{column}"' for column in columns)
+                updates = ', '.join(f'"{column}" = excluded."{column}"' for column in columns if column != key)
+                self.upsert_sql[table] = f'''
+                    INSERT INTO {table} ({column_names}, updated_at) VALUES ({', '.join('?' * (len(columns) + 1))})
+                    ON CONFLICT ("{key}") DO UPDATE SET {updates}, updated_at = excluded.updated_at
+                '''
+            for sql in INDEXES:
+                self.conn.execute(sql)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _save(self, table: str, datas):
+        key, columns = TABLES[table]
+        with self.lock:
+            buffer = self.buffers[table]
+            for data in datas:
+                # 同一批中重复的数据只保留最新的一条
+                buffer[data[key]] = _to_row(data, columns)
+            if len(buffer) < self.batch_size:
+                return
+        self.flush()
+
+    def save_users(self, users):
+        self._save('users', users)
+
+    def save_notes(self, notes):
+        self._save('notes', notes)
+
+    def save_comments(self, comments, note_user_id: str = None):
+        """
+            :param note_user_id: 与 Parquet_Sink 的接口一致，数据库中通过 notes 表查询笔记作者，不需要保存
+        """
+        self._save('comments', comments)
+
+    def flush(self):
+        """
+            在一个事务中写入所有缓冲的数据
+        """
+        with self.lock:
+            now = time.time()
+            with self.conn:
+                for table, buffer in self.buffers.items():
+                    if buffer:
+                        self.conn.executemany(self.upsert_sql[table], [row + [now] for row in buffer.values()])
+                        buffer.clear()
+
+    def commit(self):
+        """
+            写入缓冲的数据，返回后数据已经持久化；Data_Spider 在记录爬取进度前调用
+        """
+        self.flush()
+
+    def _query(self, table: str, where: str = '', params=(), order_by: str = ''):
+        """
+            逐行返回查询结果，每次只从数据库读取一批
+        """
+        self.flush()
+        key, columns = TABLES[table]
+        column_names = ', '.join(f'{table}."{column}"' for column in columns)
+        sql = f'SELECT {column_names} FROM {table} {where} {order_by}'
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield _from_row(row, columns)
+
+    def get_user(self, user_id: str):
+        for user in self._query('users', 'WHERE user_id = ?', (user_id,)):
+            return user
+        return None
+
+    def iter_users(self):
+        return self._query('users')
+
+    def iter_notes(self, user_id: str = None):
+        """
+            :param user_id: 只返回这个用户发布的笔记，None 为全部
+        """
+        if user_id is None:
+            return self._query('notes', order_by='ORDER BY upload_time DESC')
+        return self._query('notes', 'WHERE user_id = ?', (user_id,), 'ORDER BY upload_time DESC')
+
+    def iter_comments(self, note_id: str = None, note_user_id: str = None):
+        """
+            :param note_id: 只返回这篇笔记的评论
+            :param note_user_id: 只返回这个用户发布的笔记下的评论
+        """
+        if note_id is not None:
+            return self._query('comments', 'WHERE note_id = ?', (note_id,), 'ORDER BY upload_time')
+        if note_user_id is not None:
+            return self._query('comments', 'WHERE note_id IN (SELECT note_id FROM notes WHERE user_id = ?)', (note_user_id,), 'ORDER BY note_id, upload_time')
+        return self._query('comments', order_by='ORDER BY note_id, upload_time')
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+
+def export_xlsx(storage: Sqlite_Storage, excel_path: str, excel_name: str, user_id: str = None):
+    """
+        从数据库重新生成xlsx，格式与 spider_user_complete_data 保存的一致:
+        {excel_name}_用户信息.xlsx、{excel_name}_笔记.xlsx、{excel_name}_所有笔记评论汇总.xlsx
+        :param user_id: 只导出这个用户的数据，None 为全部
+        返回生成的文件路径列表
+    """
+    if user_id is not None:
+        user = storage.get_user(user_id)
+        users = [user] if user is not None else []
+    else:
+        users = storage.iter_users()
+    exports = [
+        ('用户信息', 'user', users),
+        ('笔记', 'note', storage.iter_notes(user_id)),
+        ('所有笔记评论汇总', 'comment', storage.iter_comments(note_user_id=user_id)),
+    ]
+    file_paths = []
+    for suffix, type, datas in exports:
+        file_path = os.path.abspath(os.path.join(excel_path, f'{excel_name}_{suffix}.xlsx'))
+        with Xlsx_Writer(file_path, type) as writer:
+            writer.write_rows(datas)
+        file_paths.extend(writer.file_paths)
+    logger.info(f'已从 {storage.db_path} 导出 {len(file_paths)} 个文件')
+    return file_paths
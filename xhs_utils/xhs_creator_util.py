@@ -1,6 +1,7 @@
 import json
 
 import execjs
+from xhs_utils.sign_util import get_sign_backend, get_sign_worker
 
 try:
     js = execjs.compile(open(r'../static/xhs_creator_xs.js', 'r', encoding='utf-8').read())
@@ -9,7 +10,10 @@ except:
 
 
 def generate_xs(a1, api, data=''):
-    ret = js.call('get_request_headers_params', api, data, a1)
+    if get_sign_backend() == 'execjs':
+        ret = js.call('get_request_headers_params', api, data, a1)
+    else:
+        ret = get_sign_worker().call('creator', 'get_request_headers_params', api, data, a1)
     xs, xt = ret['xs'], ret['xt']
     if data:
         data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
@@ -1,8 +1,11 @@
 import json
 import math
 import random
+import time
 import execjs
 from xhs_utils.cookie_util import trans_cookies
+from xhs_utils.native_sign_util import get_request_headers_params as native_request_headers_params, trace_id as native_trace_id
+from xhs_utils.sign_util import get_sign_backend, get_sign_worker, Trace_Id_Pool
 
 try:
     js = execjs.compile(open(r'../static/xhs_xs_xsc_56.js', 'r', encoding='utf-8').read())
@@ -21,17 +24,50 @@ def generate_x_b3_traceid(len=16):
     return x_b3_traceid
 
 def generate_xs_xs_common(a1, api, data='', method='POST'):
-    ret = js.call('get_request_headers_params', api, data, a1, method)
+    backend = get_sign_backend()
+    if backend == 'native':
+        ret = native_request_headers_params(api, data, a1, method)
+    elif backend == 'execjs':
+        ret = js.call('get_request_headers_params', api, data, a1, method)
+    else:
+        ret = get_sign_worker().call('xs', 'get_request_headers_params', api, data, a1, method)
     xs, xt, xs_common = ret['xs'], ret['xt'], ret['xs_common']
     return xs, xt, xs_common
 
+def sign_many(a1, sign_list):
+    """
+        批量生成 xs xt xs_common
+        :param a1: cookies中的a1
+        :param sign_list: [(api, data, method), ...]
+        按顺序返回 [(xs, xt, xs_common), ...]，使用签名进程时每个进程只需要一次往返
+    """
+    backend = get_sign_backend()
+    if backend == 'native':
+        rets = [native_request_headers_params(api, data, a1, method) for api, data, method in sign_list]
+    elif backend == 'execjs':
+        rets = [js.call('get_request_headers_params', api, data, a1, method) for api, data, method in sign_list]
+    else:
+        calls = [('xs', 'get_request_headers_params', (api, data, a1, method)) for api, data, method in sign_list]
+        rets = get_sign_worker().call_many(calls)
+    return [(ret['xs'], ret['xt'], ret['xs_common']) for ret in rets]
+
 def generate_xs(a1, api, data=''):
     ret = js.call('get_xs', api, data, a1)
     xs, xt = ret['X-s'], ret['X-t']
     return xs, xt
 
+def generate_xray_traceids(num):
+    if get_sign_backend() == 'execjs':
+        return xray_js.call('traceIds', num)
+    return get_sign_worker().call('xray', 'traceIds', num)
+
+trace_id_pool = Trace_Id_Pool(generate_xray_traceids)
+
 def generate_xray_traceid():
-    return xray_js.call('traceId')
+    if get_sign_backend() == 'native':
+        return native_trace_id()
+    return trace_id_pool.get()
+
 def get_common_headers():
     return {
         "authority": "www.xiaohongshu.com",
@@ -75,8 +111,10 @@ def get_request_headers_template():
         "x-xray-traceid": generate_xray_traceid()
     }
 
-def generate_headers(a1, api, data='', method='POST'):
-    xs, xt, xs_common = generate_xs_xs_common(a1, api, data, method)
+def generate_headers(a1, api, data='', method='POST', sign=None):
+    if sign is None:
+        sign = generate_xs_xs_common(a1, api, data, method)
+    xs, xt, xs_common = sign
     x_b3_traceid = generate_x_b3_traceid()
     headers = get_request_headers_template()
     headers['x-s'] = xs
@@ -93,6 +131,21 @@ def generate_request_params(cookies_str, api, data='', method='POST'):
     headers, data = generate_headers(a1, api, data, method)
     return headers, cookies, data
 
+def generate_many_request_params(cookies_str, request_list):
+    """
+        批量生成请求参数，签名通过 sign_many 一次完成
+        :param request_list: [(api, data, method), ...]
+        按顺序返回 [(headers, cookies, data), ...]
+    """
+    cookies = trans_cookies(cookies_str)
+    a1 = cookies['a1']
+    signs = sign_many(a1, request_list)
+    params_list = []
+    for (api, data, method), sign in zip(request_list, signs):
+        headers, data = generate_headers(a1, api, data, method, sign)
+        params_list.append((headers, cookies, data))
+    return params_list
+
 def splice_str(api, params):
     url = api + '?'
     for key, value in params.items():
@@ -101,3 +154,16 @@ def splice_str(api, params):
         url += key + '=' + value + '&'
     return url[:-1]
 
+def get_note_create_time(note_id):
+    """
+        笔记id与MongoDB的ObjectId格式相同，前8位十六进制是发布时间的秒级时间戳
+        返回时间戳，无法解析时返回None
+    """
+    try:
+        timestamp = int(note_id[:8], 16)
+    except (TypeError, ValueError):
+        return None
+    # 早于2013年或晚于当前时间说明不是这种格式的id
+    if timestamp < 1356998400 or timestamp > time.time() + 86400:
+        return None
+    return timestamp